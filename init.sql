@@ -20,7 +20,11 @@ CREATE TABLE IF NOT EXISTS airports (
     tz_database VARCHAR(50),
     type VARCHAR(20),
     source VARCHAR(20)
-) WITH SYSTEM VERSIONING;
+) WITH SYSTEM VERSIONING
+  PARTITION BY SYSTEM_TIME (
+    PARTITION p_history HISTORY,
+    PARTITION p_current CURRENT
+  );
 
 -- Create airlines table with system versioning
 CREATE TABLE IF NOT EXISTS airlines (
@@ -32,7 +36,11 @@ CREATE TABLE IF NOT EXISTS airlines (
     callsign VARCHAR(255),
     country VARCHAR(100),
     active CHAR(1)
-) WITH SYSTEM VERSIONING;
+) WITH SYSTEM VERSIONING
+  PARTITION BY SYSTEM_TIME (
+    PARTITION p_history HISTORY,
+    PARTITION p_current CURRENT
+  );
 
 -- Create routes table with system versioning
 CREATE TABLE IF NOT EXISTS routes (
@@ -46,4 +54,26 @@ CREATE TABLE IF NOT EXISTS routes (
     codeshare CHAR(1),
     stops INT,
     equipment VARCHAR(255)
-) WITH SYSTEM VERSIONING;
\ No newline at end of file
+) WITH SYSTEM VERSIONING
+  PARTITION BY SYSTEM_TIME (
+    PARTITION p_history HISTORY,
+    PARTITION p_current CURRENT
+  );
+
+-- Progress of checkpointed selective restores, one row per restore
+CREATE TABLE IF NOT EXISTS restore_checkpoints (
+    restore_id CHAR(32) PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    batch_size INT NOT NULL,
+    last_batch INT NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL,
+    records LONGTEXT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Secondary indexes for the columns used in lookups and FK validation
+CREATE INDEX IF NOT EXISTS idx_airports_iata ON airports (iata_code);
+CREATE INDEX IF NOT EXISTS idx_airlines_iata ON airlines (iata_code);
+CREATE INDEX IF NOT EXISTS idx_routes_airline ON routes (airline_id);
+CREATE INDEX IF NOT EXISTS idx_routes_source ON routes (source_airport_id);
+CREATE INDEX IF NOT EXISTS idx_routes_destination ON routes (destination_airport_id);
\ No newline at end of file
@@ -8,26 +8,76 @@ import csv
 import sys
 import os
 
+# Rows per executemany call, small enough to stay under max_allowed_packet
+BATCH_SIZE = 1000
+
+# Session settings for the bulk load, restored once loading finishes
+BULK_LOAD_SETTINGS = """
+    SET SESSION unique_checks = 0,
+                foreign_key_checks = 0,
+                bulk_insert_buffer_size = 268435456
+"""
+
+# File, duplicate handling and column mapping for LOAD DATA, per table
+BULK_LOAD_FILES = {
+    'airports': ('airports.dat', 'IGNORE', """
+        (airport_id, name, city, country, iata_code, icao_code,
+         latitude, longitude, altitude, timezone, dst, tz_database, type, source)
+    """),
+    'airlines': ('airlines.dat', 'IGNORE', """
+        (airline_id, name, alias, iata_code, icao_code, callsign, country, active)
+    """),
+    'routes': ('routes.dat', '', """
+        (airline_code, airline_id, source_airport, source_airport_id,
+         destination_airport, destination_airport_id, codeshare, @stops, equipment)
+        SET stops = IFNULL(@stops, 0)
+    """)
+}
+
 def load_data():
     """Load OpenFlights data"""
     
     try:
         from src.config import DATABASE_CONFIG
-        conn = mariadb.connect(**DATABASE_CONFIG)
+        conn = mariadb.connect(**DATABASE_CONFIG, local_infile=True)
         cursor = conn.cursor()
         
         print("📊 Loading OpenFlights dataset...")
         
-        # Load airports
-        airports_count = load_airports(cursor)
-        
-        # Load airlines  
-        airlines_count = load_airlines(cursor)
+        # Load everything in one transaction with per-row checks relaxed for this session
+        cursor.execute("SELECT @@unique_checks, @@foreign_key_checks, @@bulk_insert_buffer_size")
+        saved_settings = cursor.fetchone()
+        conn.autocommit = False
+        cursor.execute(BULK_LOAD_SETTINGS)
         
-        # Load routes
-        routes_count = load_routes(cursor)
-        
-        conn.commit()
+        try:
+            try:
+                # Fast path: let the server parse the CSV files directly
+                airports_count = bulk_load(cursor, 'airports')
+                airlines_count = bulk_load(cursor, 'airlines')
+                routes_count = bulk_load(cursor, 'routes')
+            except mariadb.Error as e:
+                print(f"⚠️  LOAD DATA LOCAL INFILE unavailable ({e}), using batched inserts")
+                conn.rollback()
+                
+                # Load airports
+                airports_count = load_airports(cursor)
+                
+                # Load airlines  
+                airlines_count = load_airlines(cursor)
+                
+                # Load routes
+                routes_count = load_routes(cursor)
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute(
+                "SET SESSION unique_checks = %d, foreign_key_checks = %d, bulk_insert_buffer_size = %d" 
+                % tuple(int(value) for value in saved_settings)
+            )
         
         print(f"\n✅ Data loaded successfully!")
         print(f"   Airports: {airports_count:,}")
@@ -43,104 +93,133 @@ def load_data():
         print(f"❌ Loading failed: {e}")
         sys.exit(1)
 
-def load_airports(cursor):
-    """Load airports data"""
-    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'airports.dat')
+def bulk_load(cursor, table):
+    """Load one OpenFlights file with LOAD DATA LOCAL INFILE, returns rows inserted"""
+    filename, mode, columns = BULK_LOAD_FILES[table]
+    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', filename)
+    escaped_path = data_path.replace('\\', '\\\\').replace("'", "\\'")
     
+    # The default ESCAPED BY '\\' already turns the unquoted \N markers into NULL
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE '{escaped_path}' {mode} INTO TABLE {table}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        {columns}
+    """)
+    return max(cursor.rowcount, 0)
+
+def insert_batches(cursor, query, rows):
+    """Insert rows with executemany in fixed-size batches, returns rows inserted"""
     count = 0
-    with open(data_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if len(row) >= 14:
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        try:
+            cursor.executemany(query, batch)
+            count += max(cursor.rowcount, 0)
+        except mariadb.Error:
+            # Retry the failed batch row by row so only the bad rows are lost
+            for row in batch:
                 try:
-                    cursor.execute("""
-                        INSERT IGNORE INTO airports 
-                        (airport_id, name, city, country, iata_code, icao_code, 
-                         latitude, longitude, altitude, timezone, dst, tz_database, type, source)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        int(row[0]) if row[0] != '\\N' else None,
-                        row[1].strip('"'),
-                        row[2].strip('"'),
-                        row[3].strip('"'),
-                        row[4].strip('"') if row[4] != '\\N' else None,
-                        row[5].strip('"') if row[5] != '\\N' else None,
-                        float(row[6]) if row[6] != '\\N' else None,
-                        float(row[7]) if row[7] != '\\N' else None,
-                        int(row[8]) if row[8] != '\\N' else None,
-                        float(row[9]) if row[9] != '\\N' else None,
-                        row[10].strip('"') if row[10] != '\\N' else None,
-                        row[11].strip('"') if row[11] != '\\N' else None,
-                        row[12].strip('"') if row[12] != '\\N' else None,
-                        row[13].strip('"') if row[13] != '\\N' else None
-                    ))
-                    if cursor.rowcount > 0:
-                        count += 1
-                except:
-                    continue
+                    cursor.execute(query, row)
+                    count += max(cursor.rowcount, 0)
+                except mariadb.Error as e:
+                    print(f"⚠️  Skipped row {row}: {e}")
     return count
 
-def load_airlines(cursor):
-    """Load airlines data"""
-    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'airlines.dat')
+def read_rows(filename, parse):
+    """Parse one OpenFlights file up front, keeping rows that parse and reporting the rest"""
+    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', filename)
     
-    count = 0
     with open(data_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if len(row) >= 8:
-                try:
-                    cursor.execute("""
-                        INSERT IGNORE INTO airlines 
-                        (airline_id, name, alias, iata_code, icao_code, callsign, country, active)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        int(row[0]) if row[0] != '\\N' else None,
-                        row[1].strip('"'),
-                        row[2].strip('"') if row[2] != '\\N' else None,
-                        row[3].strip('"') if row[3] != '\\N' else None,
-                        row[4].strip('"') if row[4] != '\\N' else None,
-                        row[5].strip('"') if row[5] != '\\N' else None,
-                        row[6].strip('"'),
-                        row[7].strip('"')
-                    ))
-                    if cursor.rowcount > 0:
-                        count += 1
-                except:
-                    continue
-    return count
+        parsed = list(map(parse, csv.reader(file)))
+    
+    rows = [row for row in parsed if row is not None]
+    skipped = len(parsed) - len(rows)
+    if skipped:
+        print(f"⚠️  Skipped {skipped:,} malformed rows in {filename}")
+    return rows
+
+def parse_airport(row):
+    """airports.dat row as an insert tuple, None if it does not parse"""
+    try:
+        return (
+            int(row[0]) if row[0] != '\\N' else None,
+            row[1],
+            row[2],
+            row[3],
+            row[4] if row[4] != '\\N' else None,
+            row[5] if row[5] != '\\N' else None,
+            float(row[6]) if row[6] != '\\N' else None,
+            float(row[7]) if row[7] != '\\N' else None,
+            int(row[8]) if row[8] != '\\N' else None,
+            float(row[9]) if row[9] != '\\N' else None,
+            row[10] if row[10] != '\\N' else None,
+            row[11] if row[11] != '\\N' else None,
+            row[12] if row[12] != '\\N' else None,
+            row[13] if row[13] != '\\N' else None
+        )
+    except (ValueError, IndexError):
+        return None
+
+def parse_airline(row):
+    """airlines.dat row as an insert tuple, None if it does not parse"""
+    try:
+        return (
+            int(row[0]) if row[0] != '\\N' else None,
+            row[1],
+            row[2] if row[2] != '\\N' else None,
+            row[3] if row[3] != '\\N' else None,
+            row[4] if row[4] != '\\N' else None,
+            row[5] if row[5] != '\\N' else None,
+            row[6],
+            row[7]
+        )
+    except (ValueError, IndexError):
+        return None
+
+def parse_route(row):
+    """routes.dat row as an insert tuple, None if it does not parse"""
+    try:
+        return (
+            row[0] if row[0] != '\\N' else None,
+            int(row[1]) if row[1] != '\\N' else None,
+            row[2] if row[2] != '\\N' else None,
+            int(row[3]) if row[3] != '\\N' else None,
+            row[4] if row[4] != '\\N' else None,
+            int(row[5]) if row[5] != '\\N' else None,
+            row[6] if row[6] != '\\N' else None,
+            int(row[7]) if row[7] != '\\N' else 0,
+            row[8] if row[8] != '\\N' else None
+        )
+    except (ValueError, IndexError):
+        return None
+
+def load_airports(cursor):
+    """Load airports data"""
+    return insert_batches(cursor, """
+        INSERT IGNORE INTO airports 
+        (airport_id, name, city, country, iata_code, icao_code, 
+         latitude, longitude, altitude, timezone, dst, tz_database, type, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, read_rows('airports.dat', parse_airport))
+
+def load_airlines(cursor):
+    """Load airlines data"""
+    return insert_batches(cursor, """
+        INSERT IGNORE INTO airlines 
+        (airline_id, name, alias, iata_code, icao_code, callsign, country, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, read_rows('airlines.dat', parse_airline))
 
 def load_routes(cursor):
     """Load routes data"""
-    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'routes.dat')
-    
-    count = 0
-    with open(data_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if len(row) >= 9:
-                try:
-                    cursor.execute("""
-                        INSERT INTO routes 
-                        (airline_code, airline_id, source_airport, source_airport_id, 
-                         destination_airport, destination_airport_id, codeshare, stops, equipment)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        row[0].strip('"') if row[0] != '\\N' else None,
-                        int(row[1]) if row[1] != '\\N' else None,
-                        row[2].strip('"') if row[2] != '\\N' else None,
-                        int(row[3]) if row[3] != '\\N' else None,
-                        row[4].strip('"') if row[4] != '\\N' else None,
-                        int(row[5]) if row[5] != '\\N' else None,
-                        row[6].strip('"') if row[6] != '\\N' else None,
-                        int(row[7]) if row[7] != '\\N' else 0,
-                        row[8].strip('"') if row[8] != '\\N' else None
-                    ))
-                    if cursor.rowcount > 0:
-                        count += 1
-                except:
-                    continue
-    return count
+    return insert_batches(cursor, """
+        INSERT INTO routes 
+        (airline_code, airline_id, source_airport, source_airport_id, 
+         destination_airport, destination_airport_id, codeshare, stops, equipment)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, read_rows('routes.dat', parse_route))
 
 if __name__ == "__main__":
     load_data()
\ No newline at end of file
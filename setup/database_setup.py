@@ -4,79 +4,121 @@ Creates MariaDB database with System-Versioned tables
 """
 
 import mariadb
+from mariadb.constants import CLIENT
 import sys
 
+VERSIONED_TABLES = ('airports', 'airlines', 'routes')
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS airports (
+        airport_id INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        city VARCHAR(100),
+        country VARCHAR(100),
+        iata_code VARCHAR(3),
+        icao_code VARCHAR(4),
+        latitude DECIMAL(10, 6),
+        longitude DECIMAL(11, 6),
+        altitude INT,
+        timezone DECIMAL(4, 2),
+        dst CHAR(1),
+        tz_database VARCHAR(50),
+        type VARCHAR(20),
+        source VARCHAR(20)
+    ) WITH SYSTEM VERSIONING
+      PARTITION BY SYSTEM_TIME (
+        PARTITION p_history HISTORY,
+        PARTITION p_current CURRENT
+      )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS airlines (
+        airline_id INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        alias VARCHAR(255),
+        iata_code VARCHAR(2),
+        icao_code VARCHAR(3),
+        callsign VARCHAR(255),
+        country VARCHAR(100),
+        active CHAR(1)
+    ) WITH SYSTEM VERSIONING
+      PARTITION BY SYSTEM_TIME (
+        PARTITION p_history HISTORY,
+        PARTITION p_current CURRENT
+      )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS routes (
+        route_id INT AUTO_INCREMENT PRIMARY KEY,
+        airline_code VARCHAR(3),
+        airline_id INT,
+        source_airport VARCHAR(4),
+        source_airport_id INT,
+        destination_airport VARCHAR(4),
+        destination_airport_id INT,
+        codeshare CHAR(1),
+        stops INT,
+        equipment VARCHAR(255)
+    ) WITH SYSTEM VERSIONING
+      PARTITION BY SYSTEM_TIME (
+        PARTITION p_history HISTORY,
+        PARTITION p_current CURRENT
+      )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS restore_checkpoints (
+        restore_id CHAR(32) PRIMARY KEY,
+        table_name VARCHAR(64) NOT NULL,
+        batch_size INT NOT NULL,
+        last_batch INT NOT NULL DEFAULT 0,
+        status VARCHAR(16) NOT NULL,
+        records LONGTEXT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """
+]
+
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS idx_airports_iata ON airports (iata_code)",
+    "CREATE INDEX IF NOT EXISTS idx_airlines_iata ON airlines (iata_code)",
+    "CREATE INDEX IF NOT EXISTS idx_routes_airline ON routes (airline_id)",
+    "CREATE INDEX IF NOT EXISTS idx_routes_source ON routes (source_airport_id)",
+    "CREATE INDEX IF NOT EXISTS idx_routes_destination ON routes (destination_airport_id)"
+]
+
+# Whole schema as one multi-statement script, sent in a single round trip
+SETUP_SCRIPT = ";\n".join(
+    ["CREATE DATABASE IF NOT EXISTS flightvault", "USE flightvault"]
+    + SCHEMA_STATEMENTS
+    + INDEX_STATEMENTS
+)
+
 def setup_database():
     """Create FlightVault database with system-versioned tables"""
     
     try:
         from src.config import DATABASE_CONFIG
-        conn = mariadb.connect(**DATABASE_CONFIG)
+        conn = mariadb.connect(**DATABASE_CONFIG, client_flag=CLIENT.MULTI_STATEMENTS)
         cursor = conn.cursor()
         
         print("🔧 Creating FlightVault database...")
+        print("📋 Creating system-versioned tables and indexes...")
         
-        cursor.execute("CREATE DATABASE IF NOT EXISTS flightvault")
-        cursor.execute("USE flightvault")
-        
-        print("📋 Creating system-versioned tables...")
-        
-        # Airports table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS airports (
-            airport_id INT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            city VARCHAR(100),
-            country VARCHAR(100),
-            iata_code VARCHAR(3),
-            icao_code VARCHAR(4),
-            latitude DECIMAL(10, 6),
-            longitude DECIMAL(11, 6),
-            altitude INT,
-            timezone DECIMAL(4, 2),
-            dst CHAR(1),
-            tz_database VARCHAR(50),
-            type VARCHAR(20),
-            source VARCHAR(20)
-        ) WITH SYSTEM VERSIONING
-        """)
-        
-        # Airlines table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS airlines (
-            airline_id INT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            alias VARCHAR(255),
-            iata_code VARCHAR(2),
-            icao_code VARCHAR(3),
-            callsign VARCHAR(255),
-            country VARCHAR(100),
-            active CHAR(1)
-        ) WITH SYSTEM VERSIONING
-        """)
-        
-        # Routes table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS routes (
-            route_id INT AUTO_INCREMENT PRIMARY KEY,
-            airline_code VARCHAR(3),
-            airline_id INT,
-            source_airport VARCHAR(4),
-            source_airport_id INT,
-            destination_airport VARCHAR(4),
-            destination_airport_id INT,
-            codeshare CHAR(1),
-            stops INT,
-            equipment VARCHAR(255)
-        ) WITH SYSTEM VERSIONING
-        """)
+        cursor.execute(SETUP_SCRIPT)
+        while cursor.nextset():
+            pass
         
         conn.commit()
         
         # Verify system versioning
-        cursor.execute("SHOW CREATE TABLE airports")
-        result = cursor.fetchone()
-        if "SYSTEM VERSIONING" in result[1]:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.tables "
+            "WHERE table_schema = 'flightvault' AND table_type = 'SYSTEM VERSIONED' "
+            "AND table_name IN (%s, %s, %s)",
+            VERSIONED_TABLES
+        )
+        if cursor.fetchone()[0] == len(VERSIONED_TABLES):
             print("✅ System versioning enabled successfully")
         
         print("🎉 Database setup complete!")
@@ -90,4 +132,4 @@ def setup_database():
         sys.exit(1)
 
 if __name__ == "__main__":
-    setup_database()
\ No newline at end of file
+    setup_database()
@@ -1,12 +1,22 @@
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
-from src.core.temporal_engine import TemporalEngine
+from src.core.temporal_engine import TemporalEngine, SnapshotCache
+
+PRIMARY_KEYS = {
+    'airports': 'airport_id',
+    'airlines': 'airline_id',
+    'routes': 'route_id'
+}
+
+# Below this combined size a linear scan beats building hash lookups
+SMALL_DIFF_THRESHOLD = 128
 
 class DiffAnalyzer:
     """Analyze differences between timestamps"""
     
-    def __init__(self, engine: TemporalEngine):
+    def __init__(self, engine: TemporalEngine, snapshots: Optional[SnapshotCache] = None):
         self.engine = engine
+        self.snapshots = snapshots or SnapshotCache(engine)
     
     def compare_timestamps(self, table: str, timestamp1: datetime, 
                           timestamp2: Optional[datetime] = None) -> Dict:
@@ -16,8 +26,8 @@ class DiffAnalyzer:
             timestamp2 = datetime.now()
         
         # Get data at both timestamps
-        data1 = self.engine.query_as_of(table, timestamp1)
-        data2 = self.engine.query_as_of(table, timestamp2)
+        data1 = self.snapshots.query_as_of(table, timestamp1)
+        data2 = self.snapshots.query_as_of(table, timestamp2)
         
         # Calculate differences
         added, removed, modified = self._calculate_diff(data1, data2, table)
@@ -41,45 +51,90 @@ class DiffAnalyzer:
     def _calculate_diff(self, data1: List[Dict], data2: List[Dict], table: str) -> Tuple[List[Dict], List[Dict], List[Dict]]:
         """Calculate added, removed, and modified records"""
         
+        # One empty side means everything was added or removed
+        if not data1:
+            return list(data2), [], []
+        if not data2:
+            return [], list(data1), []
+        
         # Get primary key field
         pk_field = self._get_primary_key(table)
         
-        # Create lookup dictionaries
-        dict1 = {record[pk_field]: record for record in data1}
-        dict2 = {record[pk_field]: record for record in data2}
+        # Tiny inputs are cheaper to scan than to hash
+        if len(data1) + len(data2) < SMALL_DIFF_THRESHOLD:
+            return self._calculate_diff_small(data1, data2, pk_field)
+        
+        # Hash only the smaller side and probe it with the larger one
+        build_is_before = len(data1) <= len(data2)
+        build, probe = (data1, data2) if build_is_before else (data2, data1)
+        lookup = {record[pk_field]: record for record in build}
+        
+        unmatched_probe = []
+        pairs = []
+        matched_after = {}
+        for record in probe:
+            key = record[pk_field]
+            match = lookup.pop(key, None)
+            if match is None:
+                unmatched_probe.append(record)
+            elif build_is_before:
+                matched_after[key] = record
+            else:
+                pairs.append((record, match))
+        
+        # Pairs follow data1 order on both paths, like the linear-scan diff
+        if build_is_before:
+            pairs = [(before, matched_after[before[pk_field]]) for before in data1 
+                     if before[pk_field] in matched_after]
+        
+        # Whatever is left in the lookup was never matched by the probe side
+        unmatched_build = list(lookup.values())
+        if build_is_before:
+            added, removed = unmatched_probe, unmatched_build
+        else:
+            added, removed = unmatched_build, unmatched_probe
+        
+        # Find modified records, dict equality settles unchanged rows in C
+        modified = []
+        for before, after in pairs:
+            if before != after:
+                modified.append({
+                    'before': before,
+                    'after': after,
+                    'changes': self._field_changes(before, after)
+                })
+        
+        return added, removed, modified
+    
+    def _calculate_diff_small(self, data1: List[Dict], data2: List[Dict], pk_field: str) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """Linear-scan diff for small inputs, avoids building lookup dicts"""
         
-        # Find differences
-        added = [record for pk, record in dict2.items() if pk not in dict1]
-        removed = [record for pk, record in dict1.items() if pk not in dict2]
+        added = [record for record in data2 
+                 if not any(other[pk_field] == record[pk_field] for other in data1)]
         
-        # Find modified records
+        removed = []
         modified = []
-        for pk in dict1:
-            if pk in dict2 and dict1[pk] != dict2[pk]:
+        for before in data1:
+            after = next((other for other in data2 if other[pk_field] == before[pk_field]), None)
+            if after is None:
+                removed.append(before)
+            elif before != after:
                 modified.append({
-                    'before': dict1[pk],
-                    'after': dict2[pk],
-                    'changes': self._field_changes(dict1[pk], dict2[pk])
+                    'before': before,
+                    'after': after,
+                    'changes': self._field_changes(before, after)
                 })
         
         return added, removed, modified
     
     def _get_primary_key(self, table: str) -> str:
         """Get primary key field for table"""
-        pk_map = {
-            'airports': 'airport_id',
-            'airlines': 'airline_id', 
-            'routes': 'route_id'
-        }
-        return pk_map.get(table, 'id')
+        return PRIMARY_KEYS.get(table, 'id')
     
     def _field_changes(self, before: Dict, after: Dict) -> Dict:
         """Identify which fields changed"""
-        changes = {}
-        for field in before:
-            if field in after and before[field] != after[field]:
-                changes[field] = {
-                    'before': before[field],
-                    'after': after[field]
-                }
-        return changes
\ No newline at end of file
+        return {
+            field: {'before': before[field], 'after': after[field]}
+            for field in before
+            if field in after and before[field] != after[field]
+        }
\ No newline at end of file
@@ -1,28 +1,44 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
-from src.core.temporal_engine import TemporalEngine
+from operator import not_
+from typing import Dict, List, Optional, Tuple
+from src.core.temporal_engine import TemporalEngine, SnapshotCache, to_columns
+
+REQUIRED_FIELDS = {
+    'airports': ('airport_id', 'name'),
+    'airlines': ('airline_id', 'name'),
+    'routes': ('route_id',)
+}
 
 class HealthScorer:
     """Score data health and integrity at timestamps"""
     
-    def __init__(self, engine: TemporalEngine):
+    def __init__(self, engine: TemporalEngine, snapshots: Optional[SnapshotCache] = None):
         self.engine = engine
+        self.snapshots = snapshots or SnapshotCache(engine)
+        self._expected_counts = {}  # table -> expected record count range, see clear_cache
+    
+    def clear_cache(self):
+        """Forget expected counts, call at the start of each search as the table may have changed"""
+        self._expected_counts = {}
     
     def score_health(self, table: str, timestamp: datetime) -> Dict:
         """Score data health at specific timestamp"""
         
         try:
-            data = self.engine.query_as_of(table, timestamp)
+            data = self.snapshots.query_as_of(table, timestamp)
             
             if not data:
                 return {'score': 0, 'error': 'No data found'}
             
+            # Column-wise view of the snapshot, shared by the field-level checks
+            columns = to_columns(data)
+            
             # Run all health checks
             checks = {
                 'record_count': self._check_record_count(data, table),
-                'required_fields': self._check_required_fields(data, table),
-                'foreign_keys': self._check_foreign_keys(data, table, timestamp),
-                'data_distribution': self._check_data_distribution(data, table)
+                'required_fields': self._check_required_fields(columns, table),
+                'foreign_keys': self._check_foreign_keys(columns, table, timestamp),
+                'data_distribution': self._check_data_distribution(columns, table)
             }
             
             # Calculate total score
@@ -61,25 +77,20 @@ class HealthScorer:
             'expected_range': expected
         }
     
-    def _check_required_fields(self, data: List[Dict], table: str) -> Dict:
+    def _check_required_fields(self, columns: Dict[str, tuple], table: str) -> Dict:
         """Check for NULL values in required fields"""
         
-        required_fields = {
-            'airports': ['airport_id', 'name'],
-            'airlines': ['airline_id', 'name'],
-            'routes': ['route_id']
-        }
-        
-        if table not in required_fields:
+        if table not in REQUIRED_FIELDS or not columns:
             return {'score': 25, 'status': 'healthy'}
         
-        violations = 0
-        total_checks = len(data) * len(required_fields[table])
-        
-        for record in data:
-            for field in required_fields[table]:
-                if not record.get(field):
-                    violations += 1
+        fields = REQUIRED_FIELDS[table]
+        row_count = len(next(iter(columns.values())))
+        total_checks = row_count * len(fields)
+        # A missing column counts as a violation in every row
+        violations = sum(
+            sum(map(not_, columns[field])) if field in columns else row_count
+            for field in fields
+        )
         
         if violations == 0:
             score, status = 25, 'healthy'
@@ -95,23 +106,24 @@ class HealthScorer:
             'total_checks': total_checks
         }
     
-    def _check_foreign_keys(self, data: List[Dict], table: str, timestamp: datetime) -> Dict:
+    def _check_foreign_keys(self, columns: Dict[str, tuple], table: str, timestamp: datetime) -> Dict:
         """Validate foreign key integrity"""
         
-        if table != 'routes':
+        if table != 'routes' or not columns:
             return {'score': 25, 'status': 'healthy'}
         
         try:
-            airports = self.engine.query_as_of('airports', timestamp)
+            airports = self.snapshots.query_as_of('airports', timestamp)
             valid_ids = {apt['airport_id'] for apt in airports}
             
-            valid_routes = 0
-            for route in data:
-                if (route.get('source_airport_id') in valid_ids and 
-                    route.get('destination_airport_id') in valid_ids):
-                    valid_routes += 1
+            total_routes = len(next(iter(columns.values())))
+            valid_routes = sum(
+                1 for source_id, dest_id in zip(columns.get('source_airport_id', ()), 
+                                                columns.get('destination_airport_id', ()))
+                if source_id in valid_ids and dest_id in valid_ids
+            )
             
-            valid_pct = valid_routes / len(data) if data else 1
+            valid_pct = valid_routes / total_routes if total_routes else 1
             
             if valid_pct >= 0.95:
                 score, status = 25, 'healthy'
@@ -124,19 +136,19 @@ class HealthScorer:
                 'score': score,
                 'status': status,
                 'valid_routes': valid_routes,
-                'total_routes': len(data),
+                'total_routes': total_routes,
                 'valid_percentage': valid_pct * 100
             }
             
         except:
             return {'score': 10, 'status': 'unknown', 'error': 'FK check failed'}
     
-    def _check_data_distribution(self, data: List[Dict], table: str) -> Dict:
+    def _check_data_distribution(self, columns: Dict[str, tuple], table: str) -> Dict:
         """Check data distribution patterns"""
         
-        if table == 'airports':
-            cities = [r.get('city') for r in data if r.get('city')]
-            countries = [r.get('country') for r in data if r.get('country')]
+        if table == 'airports' and columns:
+            cities = tuple(filter(None, columns.get('city', ())))
+            countries = tuple(filter(None, columns.get('country', ())))
             
             city_diversity = len(set(cities)) / len(cities) if cities else 0
             country_diversity = len(set(countries)) / len(countries) if countries else 0
@@ -166,19 +178,24 @@ class HealthScorer:
         return {'score': 25, 'status': 'healthy'}
     
     def _get_expected_count(self, table: str) -> Dict:
-        """Get expected record count range"""
+        """Get expected record count range, counted by the server once per search"""
+        
+        if table in self._expected_counts:
+            return self._expected_counts[table]
         
         try:
-            current = self.engine.query_current(table)
-            baseline = len(current)
+            baseline = self.engine.count_current(table)
             
-            return {
+            expected = {
                 'min': int(baseline * 0.8),
                 'max': int(baseline * 1.2),
                 'baseline': baseline
             }
         except:
-            return {'min': 1, 'max': 10000, 'baseline': 1000}
+            expected = {'min': 1, 'max': 10000, 'baseline': 1000}
+        
+        self._expected_counts[table] = expected
+        return expected
     
     def _get_health_level(self, score: int) -> str:
         """Convert score to health level"""
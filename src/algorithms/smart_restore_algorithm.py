@@ -1,17 +1,33 @@
+import logging
+import mariadb
 from datetime import datetime, timedelta
+from operator import and_, itemgetter
 from typing import Dict, List, Optional, Tuple
-from src.core.temporal_engine import TemporalEngine
+from src.core.temporal_engine import TemporalEngine, SnapshotCache, to_columns
 from src.algorithms.diff_analyzer import DiffAnalyzer
-from src.algorithms.health_scorer import HealthScorer
+from src.algorithms.health_scorer import HealthScorer, REQUIRED_FIELDS
+
+logger = logging.getLogger("FlightVault-SmartRestore")
+
+# Search horizon and healthy-score threshold per disaster type
+DISASTER_PROFILES = {
+    'bulk_delete': (timedelta(hours=1), 90),  # Sudden mass change, happened minutes ago
+    'drift': (timedelta(days=3), 70),  # Slow corruption, boundary is older and fuzzier
+    None: (timedelta(hours=24), 80)
+}
 
 class SmartRestorePointFinder:
     """Intelligent algorithm to find optimal restore point"""
     
-    def __init__(self, engine: TemporalEngine):
+    def __init__(self, engine: TemporalEngine, snapshots: Optional[SnapshotCache] = None):
         """Initialize the smart restore point finder with database engine and analysis tools"""
         self.engine = engine  # Core temporal database engine for querying historical data
-        self.diff_analyzer = DiffAnalyzer(engine)  # Tool for comparing data states between timestamps
-        self.health_scorer = HealthScorer(engine)  # Tool for scoring data integrity at any timestamp
+        self.snapshots = snapshots or SnapshotCache(engine)  # Shared cache of historical snapshots
+        self.diff_analyzer = DiffAnalyzer(engine, self.snapshots)  # Tool for comparing data states between timestamps
+        self.health_scorer = HealthScorer(engine, self.snapshots)  # Tool for scoring data integrity at any timestamp
+        self._health_cache = {}  # (table, timestamp) -> score_health result, reset per search
+        self._validation_cache = {}  # (table, timestamp) -> (score, details), reset per search
+        self._expected_count_cache = {}  # table -> expected record count range, reset per search
     
     def find_optimal_restore_point(self, table: str = 'airports', 
                                  disaster_type: Optional[str] = None) -> Dict:
@@ -22,23 +38,31 @@ class SmartRestorePointFinder:
         Output: Dictionary with optimal timestamp, confidence score, and details
         """
         
-        # Step 1: Define Search Window (24 hours back)
+        # Step 1: Define Search Window (24 hours back unless the disaster type says otherwise)
         # We search within last 24 hours as most disasters are recent and need quick recovery
+        if disaster_type not in DISASTER_PROFILES:
+            raise ValueError(f"Unknown disaster type: {disaster_type}")
+        horizon, healthy_threshold = DISASTER_PROFILES[disaster_type]
         end_time = datetime.now()  # Current time (potentially corrupted state)
-        start_time = end_time - timedelta(hours=24)  # 24 hours ago (likely clean state)
+        start_time = end_time - horizon  # Start of the horizon (likely clean state)
         
-        print(f"🔍 Searching for optimal restore point...")
-        print(f"   Search window: {start_time.strftime('%H:%M:%S')} to {end_time.strftime('%H:%M:%S')}")
+        # Probe results are only reused within one search, as "now" moves between searches
+        self._health_cache = {}
+        self._validation_cache = {}
+        self._expected_count_cache = {}
+        self.health_scorer.clear_cache()
         
-        # Get current corrupted state as baseline for comparison
-        # This helps us understand what we're trying to recover from
-        current_state = self.engine.query_current(table)
+        logger.info("Searching for optimal restore point between %s and %s", 
+                    start_time.strftime('%H:%M:%S'), end_time.strftime('%H:%M:%S'))
+        
+        # Warm the snapshot cache with the first two levels of probes in one scan
+        self._prefetch_search_tree(table, start_time, end_time)
         
         # Step 2: Binary Search Through Time - Core Innovation
         # Instead of checking every minute (1440 checks), binary search finds optimal point in ~12 iterations
         # This is the key algorithm that makes FlightVault fast and efficient
         optimal_timestamp, search_info = self._binary_search_through_time(
-            table, start_time, end_time, current_state
+            table, start_time, end_time, healthy_threshold
         )
         
         # Step 3: Validate Stability of Restore Point
@@ -70,8 +94,8 @@ class SmartRestorePointFinder:
             }
         }
     
-    def _binary_search_through_time(self, table: str, start_time: datetime, 
-                                   end_time: datetime, current_state: List[Dict]) -> Tuple[datetime, Dict]:
+    def _binary_search_through_time(self, table: str, start_time: datetime, end_time: datetime, 
+                                   healthy_threshold: int = 80) -> Tuple[datetime, Dict]:
         """
         Step 2: Binary search to efficiently find disaster boundary
         """
@@ -80,54 +104,80 @@ class SmartRestorePointFinder:
         best_timestamp = start_time  # Track the best restore point found so far
         best_health_score = 0  # Track the highest health score encountered
         iterations = 0  # Count search iterations for performance monitoring
-        max_iterations = 15  # log2(1440 minutes) ≈ 11, so 15 provides safety margin
+        max_iterations = 15  # log4(1440 minutes) ≈ 6, so 15 provides safety margin
         
         # Binary search boundaries - these narrow down with each iteration
         current_start = start_time  # Left boundary of current search window
         current_end = end_time  # Right boundary of current search window
+        start_health = end_health = None  # Scores at the boundaries, once probed
         
-        search_log = []  # Log each iteration for debugging and analysis
+        search_log = []  # (timestamp, health_score, iteration) per probe, for debugging and analysis
         
-        # Binary search loop - continues until we reach 5-minute precision or max iterations
+        # Search loop - continues until we reach 5-minute precision or max iterations
         # 5 minutes precision is sufficient for most disaster recovery scenarios
         while (current_end - current_start).total_seconds() > 300 and iterations < max_iterations:
             iterations += 1
             
-            # Calculate midpoint between current search boundaries
-            # This is the timestamp we'll test in this iteration
-            midpoint = current_start + (current_end - current_start) / 2
-            
-            # Health Validation at This Timestamp
-            # Score data integrity (0-100) based on record count, required fields, foreign keys, etc.
-            health_result = self.health_scorer.score_health(table, midpoint)
-            health_score = health_result['score']  # Overall health score (0-100)
-            validation_details = health_result.get('checks', {})  # Detailed breakdown of checks
-            
-            search_log.append({
-                'timestamp': midpoint,
-                'health_score': health_score,
-                'iteration': iterations
-            })
-            
-            print(f"   Iteration {iterations}: {midpoint.strftime('%H:%M:%S')} - Health: {health_score}/100")
-            
-            # Track best point found so far
-            # We keep the timestamp with highest health score as our candidate restore point
-            if health_score > best_health_score:
-                best_timestamp = midpoint
-                best_health_score = health_score
-            
-            # Determine search direction - this is the key binary search logic
-            if health_score >= 80:  # Healthy data (80%+ health score)
-                # Data is good here, so disaster happened later - search forward in time
-                current_start = midpoint
-            else:  # Corrupted data (< 80% health score)
-                # Data is corrupted here, so disaster happened earlier - search backward in time
-                current_end = midpoint
+            # Probe the three quartiles of the window, so each iteration narrows it to a quarter.
+            # Once the window is under 20 minutes a plain 5-minute grid needs no more probes
+            # and finishes the search in this iteration.
+            # Their snapshots arrive in one temporal scan; the engine has a single cursor, so the
+            # probes are scored in order rather than on worker threads.
+            if (current_end - current_start).total_seconds() > 1200:
+                probes = self._quartiles(current_start, current_end)
+                # With both ends scored, aim the middle probe at the interpolated threshold
+                # crossing. The first two levels stay on quartiles to match the prefetch.
+                if (iterations > 2 and start_health is not None and end_health is not None 
+                        and start_health - end_health >= 10):
+                    probes[1] = self._interpolate_crossing(
+                        current_start, current_end, start_health, end_health, healthy_threshold
+                    )
+            else:
+                probes = self._linear_probes(current_start, current_end)
+            self.snapshots.prefetch(table, probes)
+            if table == 'routes':
+                self.snapshots.prefetch('airports', probes)
+            
+            for probe in probes:
+                # Health Validation at This Timestamp
+                # Score data integrity (0-100) based on record count, required fields, foreign keys, etc.
+                health_result = self._score_health(table, probe)
+                health_score = health_result['score']  # Overall health score (0-100)
+                validation_details = health_result.get('checks', {})  # Detailed breakdown of checks
+                
+                search_log.append((probe, health_score, iterations))
+                
+                logger.debug("Iteration %d: %s - Health: %s/100", iterations, probe.strftime('%H:%M:%S'), health_score)
+                
+                # Track best point found so far
+                # We keep the timestamp with highest health score as our candidate restore point
+                if health_score > best_health_score:
+                    best_timestamp = probe
+                    best_health_score = health_score
+                
+                # A score within 5 points of the threshold is easily misread, so confirm it
+                # with a neighbour 30 seconds later and steer by the pair's average
+                direction_score = health_score
+                neighbour = probe + timedelta(seconds=30)
+                if abs(health_score - healthy_threshold) <= 5 and neighbour < current_end:
+                    neighbour_score = self._score_health(table, neighbour)['score']
+                    direction_score = (health_score + neighbour_score) / 2
+                
+                # Determine search direction - this is the key binary search logic
+                if direction_score >= healthy_threshold:  # Healthy data (80%+ health score by default)
+                    # Data is good here, so disaster happened later - search forward in time
+                    current_start = probe
+                    start_health = health_score
+                else:  # Corrupted data (below the threshold)
+                    # Data is corrupted here, so disaster happened earlier - the later
+                    # quartiles are past the boundary and need no scoring
+                    current_end = probe
+                    end_health = health_score
+                    break
         
         # Step 4: Find Exact Disaster Boundary (minute precision)
         if (current_end - current_start).total_seconds() <= 600:  # Within 10 minutes
-            best_timestamp = self._find_exact_boundary(table, current_start, current_end)
+            best_timestamp = self._find_exact_boundary(table, current_start, current_end, healthy_threshold)
         
         # Calculate boundary clarity (how clear the disaster boundary is)
         boundary_clarity = min(best_health_score / 100.0, 1.0)
@@ -140,15 +190,70 @@ class SmartRestorePointFinder:
             'search_log': search_log
         }
     
+    @staticmethod
+    def _quartiles(start_time: datetime, end_time: datetime) -> List[datetime]:
+        """The three probe points the search tests inside a window"""
+        span = end_time - start_time
+        return [start_time + span * k / 4 for k in (1, 2, 3)]
+    
+    @staticmethod
+    def _interpolate_crossing(start_time: datetime, end_time: datetime, start_health: int,
+                              end_health: int, healthy_threshold: int) -> datetime:
+        """
+        Where the score is expected to cross the threshold, assuming it falls linearly.
+        Clamped inside the outer quartiles so the probes stay ordered.
+        """
+        fraction = (start_health - healthy_threshold) / (start_health - end_health)
+        fraction = min(max(fraction, 0.3), 0.7)
+        return start_time + (end_time - start_time) * fraction
+    
+    @staticmethod
+    def _linear_probes(start_time: datetime, end_time: datetime) -> List[datetime]:
+        """Every 5 minutes strictly inside a narrow window"""
+        probes = []
+        probe = start_time + timedelta(minutes=5)
+        while probe < end_time:
+            probes.append(probe)
+            probe += timedelta(minutes=5)
+        return probes
+    
+    def _prefetch_search_tree(self, table: str, start_time: datetime, end_time: datetime):
+        """
+        Load the probes of the first two search iterations with one batched query.
+        Which second-level window gets searched is not known yet, so all four are queued.
+        """
+        bounds = [start_time] + self._quartiles(start_time, end_time) + [end_time]
+        candidates = bounds[1:-1]
+        for window_start, window_end in zip(bounds, bounds[1:]):
+            candidates.extend(self._quartiles(window_start, window_end))
+        
+        self.snapshots.prefetch(table, candidates)
+        if table == 'routes':
+            self.snapshots.prefetch('airports', candidates)
+    
+    def _score_health(self, table: str, timestamp: datetime) -> Dict:
+        """score_health, memoized for the current search"""
+        key = (table, timestamp)
+        if key not in self._health_cache:
+            self._health_cache[key] = self.health_scorer.score_health(table, timestamp)
+        return self._health_cache[key]
+    
     def _validate_health_at_timestamp(self, table: str, timestamp: datetime) -> Tuple[int, Dict]:
         """
         Step 3: Health validation with multiple checks
         Returns health score (0-100) and detailed validation results
         """
+        key = (table, timestamp)
+        if key not in self._validation_cache:
+            self._validation_cache[key] = self._run_health_validation(table, timestamp)
+        return self._validation_cache[key]
+    
+    def _run_health_validation(self, table: str, timestamp: datetime) -> Tuple[int, Dict]:
+        """Uncached body of _validate_health_at_timestamp"""
         
         try:
             # Query data at this timestamp
-            data_at_timestamp = self.engine.query_as_of(table, timestamp)
+            data_at_timestamp = self.snapshots.query_as_of(table, timestamp)
             
             if not data_at_timestamp:
                 return 0, {'error': 'No data found at timestamp'}
@@ -156,6 +261,9 @@ class SmartRestorePointFinder:
             validation_results = {}
             total_score = 0
             
+            # Transpose the snapshot once, the field-level checks all read it column-wise
+            columns = to_columns(data_at_timestamp)
+            
             # Check 1: Record Count Validation (25 points)
             expected_count = self._get_expected_record_count(table)
             actual_count = len(data_at_timestamp)
@@ -177,17 +285,17 @@ class SmartRestorePointFinder:
             }
             
             # Check 2: No NULL Values in Required Fields (25 points)
-            null_score = self._check_required_fields(data_at_timestamp, table)
+            null_score = self._check_required_fields(columns, table)
             total_score += null_score
             validation_results['required_fields'] = {'score': null_score}
             
             # Check 3: Foreign Key Integrity (25 points)
-            fk_score = self._validate_foreign_keys(table, timestamp, data_at_timestamp)
+            fk_score = self._validate_foreign_keys(table, timestamp, columns)
             total_score += fk_score
             validation_results['foreign_keys'] = {'score': fk_score}
             
             # Check 4: Data Distribution Validation (25 points)
-            distribution_score = self._check_data_distribution(data_at_timestamp, table)
+            distribution_score = self._check_data_distribution(columns, table)
             total_score += distribution_score
             validation_results['data_distribution'] = {'score': distribution_score}
             
@@ -197,57 +305,59 @@ class SmartRestorePointFinder:
             return 0, {'error': str(e)}
     
     def _get_expected_record_count(self, table: str) -> Dict:
-        """Get expected record count range for validation"""
+        """Get expected record count range for validation, computed once per search"""
+        
+        if table not in self._expected_count_cache:
+            self._expected_count_cache[table] = self._compute_expected_record_count(table)
+        return self._expected_count_cache[table]
+    
+    def _compute_expected_record_count(self, table: str) -> Dict:
+        """Uncached body of _get_expected_record_count"""
+        
+        # Get current count (might be corrupted), needed by both branches
+        current_count = self.engine.count_current(table)
         
         # Get historical average from past week
         try:
             week_ago = datetime.now() - timedelta(days=7)
-            historical_data = self.engine.query_as_of(table, week_ago)
+            historical_data = self.snapshots.query_as_of(table, week_ago)
             historical_count = len(historical_data)
-            
-            # Get current count (might be corrupted)
-            current_data = self.engine.query_current(table)
-            current_count = len(current_data)
-            
-            # Use historical as baseline, allow some variance
-            baseline = max(historical_count, current_count)
-            
-            return {
-                'min': int(baseline * 0.8),  # 80% of baseline
-                'max': int(baseline * 1.2),  # 120% of baseline
-                'baseline': baseline
-            }
-            
-        except:
+        except mariadb.Error:
             # Fallback: assume current count is reasonable baseline
-            current_data = self.engine.query_current(table)
-            current_count = len(current_data)
-            
             return {
                 'min': max(1, int(current_count * 0.5)),
                 'max': int(current_count * 2),
                 'baseline': current_count
             }
-    
-    def _check_required_fields(self, data: List[Dict], table: str) -> int:
-        """Check for NULL values in required fields"""
         
-        required_fields = {
-            'airports': ['airport_id', 'name'],
-            'airlines': ['airline_id', 'name'],
-            'routes': ['route_id']
+        # Use historical as baseline, allow some variance
+        baseline = max(historical_count, current_count)
+        
+        return {
+            'min': int(baseline * 0.8),  # 80% of baseline
+            'max': int(baseline * 1.2),  # 120% of baseline
+            'baseline': baseline
         }
+    
+    def _check_required_fields(self, columns: Dict[str, tuple], table: str) -> int:
+        """Check for NULL values in required fields"""
         
-        if table not in required_fields or not data:
+        if table not in REQUIRED_FIELDS or not columns:
             return 25  # Full score if no requirements or no data to check
         
-        null_violations = 0
-        total_checks = len(data) * len(required_fields[table])
+        fields = REQUIRED_FIELDS[table]
+        row_count = len(next(iter(columns.values())))
+        total_checks = row_count * len(fields)
         
-        for record in data:
-            for field in required_fields[table]:
-                if record.get(field) is None or record.get(field) == '':
-                    null_violations += 1
+        # Count NULLs and empty strings per column with tuple.count, which loops in C.
+        # A missing column counts as a violation in every row.
+        null_violations = 0
+        for field in fields:
+            if field in columns:
+                column = columns[field]
+                null_violations += column.count(None) + column.count('')
+            else:
+                null_violations += row_count
         
         # Calculate score based on violation percentage
         if total_checks == 0:
@@ -264,27 +374,26 @@ class SmartRestorePointFinder:
         else:
             return 0
     
-    def _validate_foreign_keys(self, table: str, timestamp: datetime, data: List[Dict]) -> int:
+    def _validate_foreign_keys(self, table: str, timestamp: datetime, columns: Dict[str, tuple]) -> int:
         """Validate foreign key relationships at timestamp"""
         
-        if table != 'routes' or not data:
+        if table != 'routes' or not columns:
             return 25  # Full score for non-route tables or empty data
         
         try:
             # Get airports at the same timestamp for FK validation
-            airports_at_timestamp = self.engine.query_as_of('airports', timestamp)
-            valid_airport_ids = {apt['airport_id'] for apt in airports_at_timestamp}
+            airports_at_timestamp = self.snapshots.query_as_of('airports', timestamp)
+            valid_airport_ids = frozenset(map(itemgetter('airport_id'), airports_at_timestamp))
             
-            valid_routes = 0
-            total_routes = len(data)
+            total_routes = len(next(iter(columns.values())))
             
-            for route in data:
-                source_id = route.get('source_airport_id')
-                dest_id = route.get('destination_airport_id')
-                
-                # Check if both airports exist
-                if (source_id in valid_airport_ids and dest_id in valid_airport_ids):
-                    valid_routes += 1
+            # Check if both airports exist, column by column so the loop runs in C
+            is_valid = valid_airport_ids.__contains__
+            valid_routes = sum(map(
+                and_,
+                map(is_valid, columns.get('source_airport_id', ())),
+                map(is_valid, columns.get('destination_airport_id', ()))
+            ))
             
             if total_routes == 0:
                 return 25
@@ -304,25 +413,25 @@ class SmartRestorePointFinder:
         except Exception:
             return 15  # Partial score if validation fails
     
-    def _check_data_distribution(self, data: List[Dict], table: str) -> int:
+    def _check_data_distribution(self, columns: Dict[str, tuple], table: str) -> int:
         """Check if data distribution looks normal"""
         
-        if not data:
+        if not columns:
             return 0
         
         score = 0
         
         # Check 1: Geographic distribution (for airports)
         if table == 'airports':
-            cities = [record.get('city') for record in data if record.get('city')]
-            countries = [record.get('country') for record in data if record.get('country')]
-            
-            unique_cities = len(set(cities))
-            unique_countries = len(set(countries))
+            # Non-empty values per column, filtered and deduplicated in C
+            cities = tuple(filter(None, columns.get('city', ())))
+            countries = tuple(filter(None, columns.get('country', ())))
+            unique_cities, unique_countries = set(cities), set(countries)
+            city_count, country_count = len(cities), len(countries)
             
             # Good distribution means diverse cities and countries
-            if len(cities) > 0:
-                city_diversity = unique_cities / len(cities)
+            if city_count > 0:
+                city_diversity = len(unique_cities) / city_count
                 if city_diversity > 0.3:  # 30%+ unique cities
                     score += 15
                 elif city_diversity > 0.1:  # 10%+ unique cities
@@ -330,8 +439,8 @@ class SmartRestorePointFinder:
                 else:
                     score += 5
             
-            if len(countries) > 0:
-                country_diversity = unique_countries / len(countries)
+            if country_count > 0:
+                country_diversity = len(unique_countries) / country_count
                 if country_diversity > 0.1:  # 10%+ unique countries
                     score += 10
                 else:
@@ -341,25 +450,56 @@ class SmartRestorePointFinder:
         
         return min(score, 25)
     
-    def _find_exact_boundary(self, table: str, start_time: datetime, end_time: datetime) -> datetime:
+    def _find_exact_boundary(self, table: str, start_time: datetime, end_time: datetime,
+                             healthy_threshold: int = 80) -> datetime:
         """Find exact minute when disaster occurred"""
         
-        best_timestamp = start_time
-        best_health = 0
-        
-        # Check every minute in the narrow window
+        # Every minute in the narrow window is a candidate
+        candidates = []
         current = start_time
         while current <= end_time:
-            health_score, _ = self._validate_health_at_timestamp(table, current)
-            
-            if health_score > best_health:
-                best_timestamp = current
-                best_health = health_score
-            
+            candidates.append(current)
             current += timedelta(minutes=1)
         
+        # Load all candidate snapshots with one temporal scan instead of one query each
+        self.snapshots.prefetch(table, candidates)
+        if table == 'routes':
+            self.snapshots.prefetch('airports', candidates)
+        
+        # The window starts at the last healthy midpoint, bisect the minutes after it
+        best_health, _ = self._validate_health_at_timestamp(table, start_time)
+        best_timestamp, _ = self._bisect_boundary(
+            table, candidates, 0, len(candidates) - 1, start_time, best_health, healthy_threshold
+        )
+        
         return best_timestamp
     
+    def _bisect_boundary(self, table: str, candidates: List[datetime], low: int, high: int,
+                         best_timestamp: datetime, best_health: int,
+                         healthy_threshold: int = 80) -> Tuple[datetime, int]:
+        """
+        Recursive minute-level bisection, same shape as _binary_search_through_time.
+        Stops once the window is down to adjacent minutes (60 seconds).
+        """
+        
+        # Probes only replace a strictly better score, so nothing can beat a perfect one
+        if high - low <= 1 or best_health >= 100:
+            return best_timestamp, best_health
+        
+        middle = (low + high) // 2
+        health_score, _ = self._validate_health_at_timestamp(table, candidates[middle])
+        
+        if health_score > best_health:
+            best_timestamp = candidates[middle]
+            best_health = health_score
+        
+        if health_score >= healthy_threshold:  # Still healthy, disaster happened later
+            return self._bisect_boundary(table, candidates, middle, high, 
+                                         best_timestamp, best_health, healthy_threshold)
+        # Corrupted, disaster happened earlier
+        return self._bisect_boundary(table, candidates, low, middle, 
+                                     best_timestamp, best_health, healthy_threshold)
+    
     def _validate_stability(self, table: str, timestamp: datetime) -> Dict:
         """Step 5: Validate that restore point is stable (not mid-transaction)"""
         
@@ -368,9 +508,10 @@ class SmartRestorePointFinder:
             before = timestamp - timedelta(minutes=2)
             after = timestamp + timedelta(minutes=2)
             
-            data_before = self.engine.query_as_of(table, before)
-            data_at = self.engine.query_as_of(table, timestamp)
-            data_after = self.engine.query_as_of(table, after)
+            self.snapshots.prefetch(table, [before, timestamp, after])
+            data_before = self.snapshots.query_as_of(table, before)
+            data_at = self.snapshots.query_as_of(table, timestamp)
+            data_after = self.snapshots.query_as_of(table, after)
             
             # Stable if record counts are consistent
             count_before = len(data_before)
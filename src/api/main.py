@@ -1,93 +1,241 @@
 from fastapi import FastAPI, HTTPException, Query, Body, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, validator
-from typing import Optional, List, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Optional, List, Dict, Any, Iterator, Literal, Tuple
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+import asyncio
 import logging
-import traceback
+import queue
+import threading
+import time
 
-from src.core.temporal_engine import create_engine, TemporalEngine
-from src.algorithms.smart_restore_algorithm import SmartRestorePointFinder
+from src.core.temporal_engine import create_engine, get_pool, close_pool, TemporalEngine
+from src.algorithms.smart_restore_algorithm import DISASTER_PROFILES, SmartRestorePointFinder
 from src.core.selective_restore import SelectiveRestoreEngine
-from src.config import DATABASE_CONFIG
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('flightvault_api.log'),
-        logging.StreamHandler()
-    ]
-)
+from src.config import DATABASE_CONFIG, POOL_SIZE, CORS_ORIGINS
+
+# Configure logging: request threads only enqueue records, the listener thread
+# formats them and does the file and console writes
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [logging.FileHandler('flightvault_api.log'), logging.StreamHandler()]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+log_listener.start()
+
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
 logger = logging.getLogger("FlightVault-API")
 
+@lru_cache(maxsize=1024)
+def _parse_ts(value: str) -> datetime:
+    """ISO timestamp from a client, cached since the UI repeats the same ones across calls"""
+    if value.endswith('Z'):
+        return datetime.fromisoformat(value[:-1] + '+00:00')
+    return datetime.fromisoformat(value)
+
+# Versioned tables the API serves, anything else is rejected during request validation
+TableName = Literal['airports', 'airlines', 'routes']
+
 # Pydantic models for request/response validation
 class RestoreRequest(BaseModel):
-    table: str
+    table: TableName
     timestamp: Optional[str] = None
     dry_run: bool = False
     
-    @validator('table')
-    def validate_table(cls, v):
-        if v not in ['airports', 'airlines', 'routes']:
-            raise ValueError('Table must be one of: airports, airlines, routes')
-        return v
-    
-    @validator('timestamp')
+    @field_validator('timestamp')
+    @classmethod
     def validate_timestamp(cls, v):
         if v:
             try:
-                datetime.fromisoformat(v.replace('Z', '+00:00'))
+                _parse_ts(v)
             except ValueError:
                 raise ValueError('Invalid timestamp format. Use ISO format: YYYY-MM-DDTHH:MM:SS')
         return v
 
+class RestoreRule(BaseModel):
+    """Classification rule, evaluated by selective_restore.compile_rules"""
+    model_config = ConfigDict(extra='forbid')
+
+    action: Literal['keep', 'restore']
+    change_type: Optional[Literal['deleted', 'added', 'modified']] = None
+    field_pattern: Optional[str] = None
+    time_range: Optional[Tuple[datetime, datetime]] = None
+
+    @field_validator('time_range')
+    @classmethod
+    def normalize_time_range(cls, v):
+        # changed_at values are naive and second-precision, like TemporalEngine._time_param
+        if v:
+            v = tuple(ts.replace(microsecond=0, tzinfo=None) for ts in v)
+        return v
+
 class SelectiveRestoreRequest(BaseModel):
-    table: str
+    table: TableName
     timestamp: Optional[str] = None
-    rules: Optional[List[Dict]] = None
+    rules: Optional[List[RestoreRule]] = None
     execute: bool = False
+    # Commit batch by batch and record progress, so a failed restore can be resumed
+    checkpoint: bool = False
 
 class HealthResponse(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     status: str
     db_connected: bool
     timestamp: str
     version: str = "1.0.0"
 
+class ResponseCache:
+    """Short-lived in-process cache for read-heavy responses that may be a few seconds stale"""
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+    
+    def put(self, key: tuple, value: Dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop everything, called after any restore changes the data"""
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache()
+
+# Restore point suggestions, refreshed in the background so requests rarely run the finder
+SUGGESTION_REFRESH_SECONDS = 60
+suggested_restore_points: Dict[Tuple[str, Optional[str]], Tuple[float, Dict]] = {}
+
+def find_restore_point(engine: TemporalEngine, table: str, use_cached: bool = True, 
+                       disaster_type: Optional[str] = None) -> Dict:
+    """Latest find_optimal_restore_point result for a table and disaster type, recomputed when stale or not wanted"""
+    key = (table, disaster_type)
+    if use_cached:
+        entry = suggested_restore_points.get(key)
+        if entry is not None and time.monotonic() - entry[0] < 2 * SUGGESTION_REFRESH_SECONDS:
+            return entry[1]
+    result = SmartRestorePointFinder(engine).find_optimal_restore_point(table, disaster_type)
+    suggested_restore_points[key] = (time.monotonic(), result)
+    return result
+
+# (current_count, last_change) of each table when its suggestion was last computed
+suggestion_table_states: Dict[str, Tuple] = {}
+
+def refresh_suggestions():
+    """
+    Recompute the suggestion for every table that changed since its last refresh, on one
+    engine. The count is part of the state because deletes do not move last_change.
+    """
+    engine = create_engine()
+    try:
+        for table, summary in engine.multi_table_summary(recent_limit=0).items():
+            state = (summary['current_count'], summary['last_change'])
+            entry = suggested_restore_points.get((table, None))
+            if entry is not None and suggestion_table_states.get(table) == state:
+                # Nothing changed, keep serving the same suggestion
+                suggested_restore_points[(table, None)] = (time.monotonic(), entry[1])
+                continue
+            find_restore_point(engine, table, use_cached=False)
+            suggestion_table_states[table] = state
+    finally:
+        engine.close()
+
+async def refresh_suggestions_periodically():
+    while True:
+        try:
+            await run_in_threadpool(refresh_suggestions)
+        except Exception as e:
+            logger.warning("Background restore point refresh failed: %s", e)
+        await asyncio.sleep(SUGGESTION_REFRESH_SECONDS)
+
 # FastAPI app initialization
 app = FastAPI(
     title="FlightVault API",
     description="Visual Disaster Recovery Tool - Git for your database using MariaDB System-Versioned Tables",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # orjson encodes datetimes and large record lists in C
 )
 
 # CORS middleware for frontend integration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure for production
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Compress record-heavy JSON responses, small ones like /health go out as is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Connection pool lifecycle: every engine borrows a pooled connection and
+# engine.close() hands it back, so requests skip the connect/auth handshake
+@app.on_event("startup")
+async def open_connection_pool():
+    """Open the pool before the first request instead of during it"""
+    try:
+        get_pool(DATABASE_CONFIG, POOL_SIZE)
+    except Exception as e:
+        # Not fatal, the pool is opened on first use once the database is reachable
+        logger.warning("Could not open connection pool at startup: %s", e)
+
+@app.on_event("startup")
+async def start_suggestion_refresh():
+    app.state.suggestion_task = asyncio.create_task(refresh_suggestions_periodically())
+
+@app.on_event("shutdown")
+async def stop_suggestion_refresh():
+    app.state.suggestion_task.cancel()
+
+@app.on_event("shutdown")
+async def close_connection_pool():
+    close_pool()
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    """Flush queued log records before exit"""
+    log_listener.stop()
+
 # Dependency for database engine
-def get_engine() -> TemporalEngine:
-    """Dependency to get database engine"""
+def get_engine() -> Iterator[TemporalEngine]:
+    """Dependency to get database engine, closed (returned to the pool) once the request is done"""
     try:
-        return create_engine()
+        engine = create_engine()
     except Exception as e:
-        logger.error(f"Failed to create database engine: {e}")
+        logger.error("Failed to create database engine: %s", e)
         raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        yield engine
+    finally:
+        engine.close()
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}\n{traceback.format_exc()}")
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
         content={"error": "Internal server error", "detail": str(exc)}
     )
@@ -95,13 +243,15 @@ async def global_exception_handler(request, exc):
 # API Endpoints
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
+def health_check():
     """Health check endpoint"""
     try:
         engine = create_engine()
-        # Test database connection
-        engine.query_current('airports', {'airport_id': 1})
-        engine.close()
+        try:
+            # Test database connection
+            engine.query_current('airports', {'airport_id': 1})
+        finally:
+            engine.close()  # Return the connection to the pool even if the check failed
         
         return HealthResponse(
             status="ok",
@@ -109,7 +259,7 @@ async def health_check():
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return HealthResponse(
             status="error",
             db_connected=False,
@@ -117,96 +267,77 @@ async def health_check():
         )
 
 @app.get("/timeline")
-async def get_timeline(
-    table: str = Query(..., description="Table name"),
+def get_timeline(
+    table: TableName = Query(..., description="Table name"),
     hours: int = Query(24, description="Hours to look back"),
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Get timeline of changes for visualization - powers the timeline slider in frontend"""
     try:
-        if table not in ['airports', 'airlines', 'routes']:
-            raise HTTPException(status_code=400, detail="Invalid table name")
+        cache_key = ('timeline', table, hours)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         # Define time window for timeline analysis
         end_time = datetime.now()  # Current time (now)
         start_time = end_time - timedelta(hours=hours)  # X hours back
         
-        # Get audit trail from MariaDB system-versioned tables
-        # This contains all historical changes with timestamps
-        audit_trail = engine.get_audit_trail(table, limit=1000)
-        recent_changes = [
-            {
-                **entry,
-                'changed_at': entry['changed_at'].isoformat(),
-                'valid_until': entry['valid_until'].isoformat() if entry['valid_until'] else None
-            }
-            for entry in audit_trail 
-            if entry['changed_at'] >= start_time  # Filter to requested time window
-        ]
-        
-        # Group changes by 1-minute periods for timeline visualization
-        # This creates the dots/markers on the timeline slider
-        timeline_data = []
-        period_groups = {}
-        
-        for change in recent_changes:
-            # Group by 1-minute periods for optimal granularity
-            period_key = change['changed_at'][:16]  # YYYY-MM-DDTHH:MM format
-            
-            if period_key not in period_groups:
-                period_groups[period_key] = []
-            period_groups[period_key].append(change)
+        # Per-minute change counts from MariaDB system-versioned tables, aggregated
+        # by the server. This creates the dots/markers on the timeline slider.
+        buckets = engine.timeline_buckets(table, start_time, sample_size=10)
         
         # Create timeline entries for frontend visualization
-        for period, changes in sorted(period_groups.items()):
+        timeline_data = []
+        total_changes = 0
+        for bucket in buckets:
+            change_count = bucket['change_count']
+            total_changes += change_count
             timeline_data.append({
-                'timestamp': period,
-                'change_count': len(changes),
-                'changes': changes[:10],  # Limit to first 10 for performance
-                'has_mass_changes': len(changes) > 50  # Flag for major incidents
+                'timestamp': bucket['period'].strftime('%Y-%m-%dT%H:%M'),  # YYYY-MM-DDTHH:MM format
+                'change_count': change_count,
+                'changes': bucket['changes'],  # Newest 10 of the minute, for performance
+                'has_mass_changes': change_count > 50  # Flag for major incidents
             })
         
-        return {
+        response = {
             'table': table,
             'hours': hours,
-            'total_changes': len(recent_changes),
+            'total_changes': total_changes,
             'timeline': timeline_data
         }
+        response_cache.put(cache_key, response, ttl=30)
+        return response
         
     except Exception as e:
-        logger.error(f"Timeline error: {e}")
+        logger.error("Timeline error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 @app.get("/state")
-async def get_state_at_timestamp(
-    table: str = Query(..., description="Table name"),
+def get_state_at_timestamp(
+    table: TableName = Query(..., description="Table name"),
     timestamp: str = Query(..., description="ISO timestamp"),
-    limit: int = Query(25, description="Max records to return"),
-    offset: int = Query(0, description="Offset for pagination"),
+    limit: int = Query(25, ge=0, description="Max records to return"),
+    offset: int = Query(0, ge=0, description="Offset for pagination"),
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Get table state at specific timestamp - time travel query for data visualization"""
     try:
-        if table not in ['airports', 'airlines', 'routes']:
-            raise HTTPException(status_code=400, detail="Invalid table name")
-        
         # Parse ISO timestamp from frontend
         try:
-            ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            ts = _parse_ts(timestamp)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid timestamp format")
         
         # Core time-travel query: "What did the table look like at this exact moment?"
-        # Uses MariaDB's FOR SYSTEM_TIME AS OF functionality
-        all_records = engine.query_as_of(table, ts)
-        total_count = len(all_records)
-        
-        # Apply pagination for large datasets (airports table can have 10k+ records)
-        start_idx = offset
-        end_idx = offset + limit
-        records = all_records[start_idx:end_idx]
+        # Uses MariaDB's FOR SYSTEM_TIME AS OF functionality, paginated by the server
+        # since the airports table can have 10k+ records
+        total_count = engine.count_as_of(table, ts)
+        if limit == 0 or offset >= total_count:
+            # Count probe or a page past the end, the count alone answers it
+            records, has_more = [], offset < total_count
+        else:
+            records, has_more = engine.query_as_of_page(table, ts, limit, offset)
         
         return {
             'table': table,
@@ -217,79 +348,69 @@ async def get_state_at_timestamp(
             'pagination': {
                 'limit': limit,
                 'offset': offset,
-                'has_more': end_idx < total_count
+                'has_more': has_more
             }
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"State query error: {e}")
+        logger.error("State query error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 @app.get("/diff")
-async def get_diff_between_states(
-    table: str = Query(..., description="Table name"),
+def get_diff_between_states(
+    table: TableName = Query(..., description="Table name"),
     before: str = Query(..., description="Before timestamp (ISO)"),
     after: Optional[str] = Query(None, description="After timestamp (ISO), defaults to now"),
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Get diff between two timestamps"""
     try:
-        if table not in ['airports', 'airlines', 'routes']:
-            raise HTTPException(status_code=400, detail="Invalid table name")
-        
         # Parse timestamps
         try:
-            before_ts = datetime.fromisoformat(before.replace('Z', '+00:00'))
-            after_ts = datetime.fromisoformat(after.replace('Z', '+00:00')) if after else datetime.now()
+            before_ts = _parse_ts(before)
+            after_ts = _parse_ts(after) if after else datetime.now()
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid timestamp format")
         
-        # Get data at both timestamps
-        before_data = engine.query_as_of(table, before_ts)
-        after_data = engine.query_as_of(table, after_ts)
-        
-        # Calculate diff
-        diff = engine.calculate_diff(before_data, after_data, table)
+        # Let the server compute the diff, only changed rows come back
+        diff = engine.diff_between(table, before_ts, after_ts)
         
         return {
             'table': table,
             'before_timestamp': before,
-            'after_timestamp': after or datetime.now().isoformat(),
-            'before_count': len(before_data),
-            'after_count': len(after_data),
+            'after_timestamp': after or after_ts,
+            'before_count': engine.count_as_of(table, before_ts),
+            'after_count': engine.count_as_of(table, after_ts),
             'diff': diff
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Diff calculation error: {e}")
+        logger.error("Diff calculation error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 @app.get("/suggest-restore")
-async def suggest_restore_point(
-    table: str = Query(..., description="Table name"),
+def suggest_restore_point(
+    table: TableName = Query(..., description="Table name"),
+    disaster_type: Optional[str] = Query(None, description="Disaster profile: bulk_delete or drift"),
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Get suggested restore point using smart algorithm - the core AI-powered feature"""
+    if disaster_type not in DISASTER_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown disaster type: {disaster_type}")
+    
     try:
-        if table not in ['airports', 'airlines', 'routes']:
-            raise HTTPException(status_code=400, detail="Invalid table name")
-        
-        # Run the smart restore point algorithm - FlightVault's core innovation
-        # This uses binary search through 24 hours of history to find optimal restore point
-        finder = SmartRestorePointFinder(engine)
-        result = finder.find_optimal_restore_point(table)
+        # Smart restore point algorithm - FlightVault's core innovation. It binary searches
+        # through 24 hours of history (or the disaster type's horizon), so the background
+        # refresh usually has the answer ready for the default profile
+        result = find_restore_point(engine, table, disaster_type=disaster_type)
         
         return {
             'table': table,
-            'suggested_timestamp': result['optimal_timestamp'].isoformat(),
+            'suggested_timestamp': result['optimal_timestamp'],
             'confidence_percentage': result['confidence_percentage'],
             'health_score': result['health_score'],
             'reason': result['reason_chosen'],
@@ -298,31 +419,29 @@ async def suggest_restore_point(
         }
         
     except Exception as e:
-        logger.error(f"Suggest restore error: {e}")
+        logger.error("Suggest restore error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 @app.post("/restore")
-async def execute_restore(
+def execute_restore(
     request: RestoreRequest,
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Execute database restore operation - the main disaster recovery action"""
     try:
-        logger.info(f"Restore request: {request.dict()}")
+        logger.info("Restore request: %r", request)
         
         # Determine restore timestamp - either user-specified or AI-selected
         if request.timestamp:
             # Manual mode: user selected specific timestamp from timeline
-            restore_ts = datetime.fromisoformat(request.timestamp.replace('Z', '+00:00'))
-            logger.info(f"Using user-specified timestamp: {restore_ts}")
+            restore_ts = _parse_ts(request.timestamp)
+            logger.info("Using user-specified timestamp: %s", restore_ts)
         else:
-            # Smart mode: AI algorithm selects optimal restore point
-            finder = SmartRestorePointFinder(engine)
-            result = finder.find_optimal_restore_point(request.table)
+            # Smart mode: AI algorithm selects optimal restore point, a preview may
+            # use the background suggestion but a real restore recomputes it
+            result = find_restore_point(engine, request.table, use_cached=request.dry_run)
             restore_ts = result['optimal_timestamp']
-            logger.info(f"Smart algorithm selected: {restore_ts}")
+            logger.info("Smart algorithm selected: %s", restore_ts)
         
         # Get data states for comparison and restoration
         historical_data = engine.query_as_of(request.table, restore_ts)  # Clean state from past
@@ -338,7 +457,7 @@ async def execute_restore(
                 'success': True,
                 'dry_run': True,
                 'table': request.table,
-                'restore_timestamp': restore_ts.isoformat(),
+                'restore_timestamp': restore_ts,
                 'records_to_restore': len(historical_data),
                 'changes_preview': {
                     'will_add': len(diff['added']),      # Records to be added back
@@ -353,52 +472,48 @@ async def execute_restore(
         restore_result = engine.restore_records(request.table, historical_data)
         
         if restore_result['success']:
-            logger.info(f"Restore successful: {restore_result['restored_count']} records")
+            logger.info("Restore successful: %s records", restore_result['restored_count'])
+            response_cache.clear()  # Cached timelines and suggestions describe the old data
+            suggested_restore_points.clear()
             
             # Verify final state matches what we intended to restore
-            final_data = engine.query_current(request.table)
+            final_count = engine.count_current(request.table)
             
             return {
                 'success': True,
                 'table': request.table,
-                'restore_timestamp': restore_ts.isoformat(),
+                'restore_timestamp': restore_ts,
                 'records_restored': restore_result['restored_count'],
-                'final_count': len(final_data),
+                'final_count': final_count,
                 'execution_time': 'immediate'
             }
         else:
-            logger.error(f"Restore failed: {restore_result['errors']}")
+            logger.error("Restore failed: %s", restore_result['errors'])
             raise HTTPException(status_code=500, detail=f"Restore failed: {restore_result['errors']}")
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Restore execution error: {e}")
-        logger.error(f"Request data: {request.dict()}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Restore execution error: %s, request: %r", e, request, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 @app.post("/selective-restore")
-async def execute_selective_restore(
+def execute_selective_restore(
     request: SelectiveRestoreRequest,
     engine: TemporalEngine = Depends(get_engine)
 ):
     """Execute selective restore - surgical recovery"""
     try:
-        logger.info(f"Selective restore request: {request.dict()}")
+        logger.info("Selective restore request: %r", request)
         
         # Initialize selective restore engine
         selective_engine = SelectiveRestoreEngine(engine)
         
         # Determine restore timestamp
         if request.timestamp:
-            restore_ts = datetime.fromisoformat(request.timestamp.replace('Z', '+00:00'))
+            restore_ts = _parse_ts(request.timestamp)
         else:
-            finder = SmartRestorePointFinder(engine)
-            result = finder.find_optimal_restore_point(request.table)
+            result = find_restore_point(engine, request.table, use_cached=not request.execute)
             restore_ts = result['optimal_timestamp']
         
         # Analyze changes
@@ -412,14 +527,16 @@ async def execute_selective_restore(
             }
         
         # Classify changes
-        classification = selective_engine.classify_changes(change_set, request.rules)
+        # The engine tests rule keys with `in`, so unset fields must be dropped
+        rules = [rule.model_dump(exclude_none=True) for rule in request.rules] if request.rules else None
+        classification = selective_engine.classify_changes(change_set, rules)
         
         if not request.execute:
             # Preview mode
             return {
                 'preview': True,
                 'table': request.table,
-                'restore_timestamp': restore_ts.isoformat(),
+                'restore_timestamp': restore_ts,
                 'analysis': change_set,
                 'classification': {
                     'keep_count': len(classification['keep_records']),
@@ -446,99 +563,132 @@ async def execute_selective_restore(
         
         # Execute
         execution_result = selective_engine.execute_selective_restore(
-            request.table, classification['restore_records'], validation
+            request.table, classification['restore_records'], validation, checkpoint=request.checkpoint
         )
+        return selective_restore_response(request.table, execution_result)
         
-        if execution_result['success']:
-            logger.info(f"Selective restore successful: {execution_result['records_processed']} records")
-            return {
-                'success': True,
-                'table': request.table,
-                'records_processed': execution_result['records_processed'],
-                'execution_time': execution_result['execution_time'],
-                'batches_completed': execution_result['batches_completed']
-            }
-        else:
-            logger.error(f"Selective restore failed: {execution_result['errors']}")
-            raise HTTPException(status_code=500, detail=f"Selective restore failed: {execution_result['errors']}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Selective restore error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/selective-restore/{restore_id}/resume")
+def resume_selective_restore(restore_id: str, engine: TemporalEngine = Depends(get_engine)):
+    """Continue a checkpointed selective restore from its first uncommitted batch"""
+    try:
+        logger.info("Selective restore resume request: %s", restore_id)
+        execution_result = SelectiveRestoreEngine(engine).resume_selective_restore(restore_id)
+        if execution_result['table'] is None:
+            raise HTTPException(status_code=404, detail=f"Unknown restore {restore_id}")
+        return selective_restore_response(execution_result['table'], execution_result)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Selective restore error: {e}")
+        logger.error("Selective restore resume error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
+
+def selective_restore_response(table: Optional[str], execution_result: Dict) -> Dict:
+    """Response for a finished selective restore run, raising on failure"""
+    restore_id = execution_result.get('restore_id')
+    if execution_result['batches_completed']:
+        response_cache.clear()  # Cached timelines and suggestions describe the old data
+        suggested_restore_points.clear()
+    
+    if execution_result['success']:
+        logger.info("Selective restore successful: %s records", execution_result['records_processed'])
+        response = {
+            'success': True,
+            'table': table,
+            'records_processed': execution_result['records_processed'],
+            'execution_time': execution_result['execution_time'],
+            'batches_completed': execution_result['batches_completed']
+        }
+        if restore_id is not None:
+            response['restore_id'] = restore_id
+        return response
+    
+    logger.error("Selective restore failed: %s", execution_result['errors'])
+    if restore_id is not None:
+        # Earlier batches stay committed, the client needs the id to resume
+        raise HTTPException(status_code=500, detail={
+            'message': 'Selective restore failed',
+            'errors': execution_result['errors'],
+            'restore_id': restore_id
+        })
+    raise HTTPException(status_code=500, detail=f"Selective restore failed: {execution_result['errors']}")
 
 @app.get("/tables")
-async def get_available_tables(engine: TemporalEngine = Depends(get_engine)):
+def get_available_tables(engine: TemporalEngine = Depends(get_engine)):
     """Get list of available tables with metadata"""
     try:
-        tables_info = []
+        cached = response_cache.get(('tables',))
+        if cached is not None:
+            return cached
         
-        for table_name in ['airports', 'airlines', 'routes']:
-            current_data = engine.query_current(table_name)
-            recent_changes = engine.get_audit_trail(table_name, limit=10)
-            
-            tables_info.append({
+        summary = engine.multi_table_summary(['airports', 'airlines', 'routes'], recent_limit=10)
+        tables_info = [
+            {
                 'name': table_name,
-                'current_count': len(current_data),
-                'recent_changes': len(recent_changes),
-                'last_change': recent_changes[0]['changed_at'].isoformat() if recent_changes else None,
+                'current_count': table_summary['current_count'],
+                'recent_changes': table_summary['recent_changes'],
+                'last_change': table_summary['last_change'],
                 'primary_key': engine.tables[table_name]
-            })
+            }
+            for table_name, table_summary in summary.items()
+        ]
         
-        return {
+        response = {
             'tables': tables_info,
             'total_tables': len(tables_info)
         }
+        response_cache.put(('tables',), response, ttl=15)
+        return response
         
     except Exception as e:
-        logger.error(f"Tables info error: {e}")
+        logger.error("Tables info error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 # Additional utility endpoints
 
 @app.get("/stats")
-async def get_database_stats(engine: TemporalEngine = Depends(get_engine)):
+def get_database_stats(engine: TemporalEngine = Depends(get_engine)):
     """Get overall database statistics"""
     try:
+        cached = response_cache.get(('stats',))
+        if cached is not None:
+            return cached
+        
         stats = {}
         total_records = 0
         total_changes = 0
         
-        for table in ['airports', 'airlines', 'routes']:
-            current_data = engine.query_current(table)
-            audit_trail = engine.get_audit_trail(table, limit=100)
-            
-            table_stats = {
-                'current_records': len(current_data),
-                'recent_changes': len(audit_trail),
-                'last_change': audit_trail[0]['changed_at'].isoformat() if audit_trail else None
+        summary = engine.multi_table_summary(['airports', 'airlines', 'routes'], recent_limit=100)
+        for table, table_summary in summary.items():
+            stats[table] = {
+                'current_records': table_summary['current_count'],
+                'recent_changes': table_summary['recent_changes'],
+                'last_change': table_summary['last_change']
             }
-            
-            stats[table] = table_stats
-            total_records += len(current_data)
-            total_changes += len(audit_trail)
+            total_records += table_summary['current_count']
+            total_changes += table_summary['recent_changes']
         
-        return {
+        response = {
             'total_records': total_records,
             'total_recent_changes': total_changes,
             'tables': stats,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now()
         }
+        response_cache.put(('stats',), response, ttl=15)
+        return response
         
     except Exception as e:
-        logger.error(f"Stats error: {e}")
+        logger.error("Stats error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        engine.close()
 
 if __name__ == "__main__":
     import uvicorn
-    import time
     import mariadb
     
     # Wait for database to be ready
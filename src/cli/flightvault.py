@@ -6,45 +6,94 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.insert(0, project_root)
 
 import argparse
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from rich.console import Console
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from rich.panel import Panel
 from rich.text import Text
-from rich.columns import Columns
 from rich.align import Align
-from rich import box
-from src.core.temporal_engine import create_engine
-from src.algorithms.smart_restore_algorithm import SmartRestorePointFinder
-from src.core.selective_restore import SelectiveRestoreEngine
+from rich.logging import RichHandler
+
+# The engine and algorithm modules (and the mariadb driver behind them) are imported
+# in initialize(), so --help and argument errors do not pay for loading them
+
+DISPLAY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Named profiles of smart_restore_algorithm.DISASTER_PROFILES, listed here so --help
+# does not import the engine
+DISASTER_TYPES = ('bulk_delete', 'drift')
+
+# Lowest confidence percentage for each display color, checked in order
+CONFIDENCE_COLORS = ((80, "green"), (60, "yellow"), (0, "red"))
+
+def confidence_color(confidence):
+    return next((color for threshold, color in CONFIDENCE_COLORS if confidence >= threshold), "red")
+
+# fromisoformat accepts a trailing 'Z' on the supported Python 3.11+
+parse_iso_timestamp = datetime.fromisoformat
 
 class FlightVaultCLI:
     
     def __init__(self):
         self.console = Console()
         self.engine = None
+        self.snapshots = None
         self.smart_finder = None
         self.selective_engine = None
+        # Latest restore point per table with the minute it was computed in
+        self._restore_points = {}
     
-    def initialize(self):
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[bold blue]Initializing FlightVault..."),
-            console=self.console
-        ) as progress:
-            task = progress.add_task("init", total=None)
-            try:
-                self.engine = create_engine()
-                self.smart_finder = SmartRestorePointFinder(self.engine)
-                self.selective_engine = SelectiveRestoreEngine(self.engine)
-                progress.update(task, completed=True)
-                time.sleep(0.5)
-                return True
-            except Exception as e:
-                self.console.print(f"[red]Failed to initialize FlightVault: {e}[/red]")
-                return False
+    def show_engine_progress(self):
+        """Print the finder's search iterations and selective restore steps through the console"""
+        handler = RichHandler(console=self.console, show_time=False, show_level=False, show_path=False)
+        for name in ("FlightVault-SmartRestore", "FlightVault-SelectiveRestore"):
+            engine_logger = logging.getLogger(name)
+            engine_logger.addHandler(handler)
+            engine_logger.setLevel(logging.DEBUG)
+    
+    def initialize(self, use_cache=False):
+        self.console.print("[bold blue]Initializing FlightVault...[/bold blue]")
+        self.show_engine_progress()
+        try:
+            from src.core.temporal_engine import create_engine, SnapshotCache
+            from src.core.query_cache import QueryCache
+            from src.algorithms.smart_restore_algorithm import SmartRestorePointFinder
+            from src.core.selective_restore import SelectiveRestoreEngine
+            
+            self.engine = create_engine(QueryCache() if use_cache else None)
+            self.snapshots = SnapshotCache(self.engine)
+            self.smart_finder = SmartRestorePointFinder(self.engine, self.snapshots)
+            self.selective_engine = SelectiveRestoreEngine(self.engine)
+            return True
+        except Exception as e:
+            self.console.print(f"[red]Failed to initialize FlightVault: {e}[/red]")
+            return False
+    
+    def _find_restore_point(self, table, disaster_type=None):
+        """find_optimal_restore_point, reused by later commands within the same minute"""
+        minute = int(time.time()) // 60
+        key = (table, disaster_type)
+        cached = self._restore_points.get(key)
+        if cached is not None and cached[0] == minute:
+            return cached[1]
+        result = self.smart_finder.find_optimal_restore_point(table, disaster_type)
+        self._restore_points[key] = (minute, result)
+        return result
+    
+    @staticmethod
+    def _diff_with_current(table, timestamp):
+        """diff_between the current state and a snapshot on its own engine, safe to run in a worker thread"""
+        from src.core.temporal_engine import create_engine
+        
+        engine = create_engine()
+        try:
+            return engine.diff_between(table, None, timestamp)
+        finally:
+            engine.close()
     
     def show_header(self):
         ascii_art = """
@@ -134,15 +183,16 @@ class FlightVaultCLI:
         status_table.add_column("Status", justify="center")
         status_table.add_column("Details", style="dim")
         
-        # Database connection
+        # Database connection, checked by the one query that also summarizes every table
         try:
-            current_data = self.engine.query_current('airports')
+            summary = self.engine.multi_table_summary(['airports', 'airlines', 'routes'], recent_limit=10)
             status_table.add_row(
                 "Database Connection",
                 "[green]ONLINE[/green]",
                 f"MariaDB connected"
             )
         except Exception as e:
+            summary = {}
             status_table.add_row(
                 "Database Connection",
                 "[red]OFFLINE[/red]",
@@ -151,15 +201,14 @@ class FlightVaultCLI:
         
         # Table status
         for table in ['airports', 'airlines', 'routes']:
-            try:
-                data = self.engine.query_current(table)
-                changes = self.engine.get_audit_trail(table, limit=10)
+            table_summary = summary.get(table)
+            if table_summary is not None:
                 status_table.add_row(
                     f"Table: {table}",
                     "[green]ACTIVE[/green]",
-                    f"{len(data)} records, {len(changes)} recent changes"
+                    f"{table_summary['current_count']} records, {table_summary['recent_changes']} recent changes"
                 )
-            except Exception:
+            else:
                 status_table.add_row(
                     f"Table: {table}",
                     "[red]ERROR[/red]",
@@ -181,14 +230,12 @@ class FlightVaultCLI:
             end_time = datetime.now()
             start_time = end_time - timedelta(hours=hours)
             
-            audit_trail = self.engine.get_audit_trail(table, limit=1000)
-            recent_changes = [
-                entry for entry in audit_trail 
-                if entry['changed_at'] >= start_time
-            ]
+            # The server groups the window into per-second periods and
+            # only sends back the newest ten of them
+            periods, total_changes = self.engine.audit_histogram(table, start_time, bucket='second', limit=10)
             progress.update(task, completed=True)
         
-        if not recent_changes:
+        if not total_changes:
             self.console.print(Panel(
                 "[green]No changes detected in timeline window[/green]",
                 title="Timeline Status",
@@ -203,18 +250,8 @@ class FlightVaultCLI:
         timeline_table.add_column("Status", justify="center")
         timeline_table.add_column("Activity Level", style="dim")
         
-        # Group changes by minute for granular view
-        minute_changes = {}
-        for change in recent_changes:
-            minute_key = change['changed_at'].strftime('%b %d, %Y %H:%M:%S')
-            if minute_key not in minute_changes:
-                minute_changes[minute_key] = []
-            minute_changes[minute_key].append(change)
-        
-        # Show only periods with changes, sorted by time
-        for minute, changes in sorted(minute_changes.items(), key=lambda x: datetime.strptime(x[0], '%b %d, %Y %H:%M:%S'), reverse=True)[:10]:
-            change_count = len(changes)
-            
+        # Show only the latest periods with changes, newest first
+        for period, change_count in periods:
             if change_count > 500:
                 status = "[red]CRITICAL[/red]"
                 activity = "Mass changes detected"
@@ -228,15 +265,16 @@ class FlightVaultCLI:
                 status = "[green]QUIET[/green]"
                 activity = "No activity"
             
-            timeline_table.add_row(minute, str(change_count), status, activity)
+            # Format the bucket only for the rows actually shown
+            timeline_table.add_row(period.strftime('%b %d, %Y %H:%M:%S'), str(change_count), status, activity)
         
         self.console.print(timeline_table)
         
         # Current state summary
-        current_data = self.engine.query_current(table)
+        current_count = self.engine.count_current(table)
         summary_panel = Panel(
-            f"[bold]Current State:[/bold] {len(current_data)} records in {table}\n"
-            f"[bold]Total Changes:[/bold] {len(recent_changes)} in last {hours} hours",
+            f"[bold]Current State:[/bold] {current_count} records in {table}\n"
+            f"[bold]Total Changes:[/bold] {total_changes} in last {hours} hours",
             title="Summary",
             border_style="blue"
         )
@@ -245,25 +283,28 @@ class FlightVaultCLI:
     def smart_diff_viewer(self, table='airports', timestamp_str=None, detailed=False, hours=1):
         self.console.print(f"\n[bold cyan]Smart Diff Viewer[/bold cyan] for [yellow]{table}[/yellow]")
         
-        current_time = datetime.now()
         if timestamp_str:
-            compare_time = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            self.console.print(f"Comparing: [cyan]{compare_time.strftime('%Y-%m-%d %H:%M:%S')}[/cyan] vs [cyan]Current[/cyan]")
+            compare_time = parse_iso_timestamp(timestamp_str)
+            window_note = ""
         else:
             # Find the earliest change within the hours window
-            start_time = current_time - timedelta(hours=hours)
+            start_time = datetime.now() - timedelta(hours=hours)
             
-            # Get audit trail to find actual changes
-            audit_trail = self.engine.get_audit_trail(table, limit=1000)
-            recent_changes = [entry for entry in audit_trail if entry['changed_at'] >= start_time]
+            # Stream the audit trail within the window, only its earliest change time is needed
+            earliest_change = min(
+                self.engine.iter_change_times(table, limit=1000, start_time=start_time),
+                default=None
+            )
             
-            if recent_changes:
+            if earliest_change is not None:
                 # Use the earliest change time as comparison point
-                compare_time = min(change['changed_at'] for change in recent_changes) - timedelta(minutes=1)
-                self.console.print(f"Comparing: [cyan]{compare_time.strftime('%Y-%m-%d %H:%M:%S')}[/cyan] vs [cyan]Current[/cyan] (showing changes in last {hours} hours)")
+                compare_time = earliest_change - timedelta(minutes=1)
+                window_note = f" (showing changes in last {hours} hours)"
             else:
                 compare_time = start_time
-                self.console.print(f"Comparing: [cyan]{compare_time.strftime('%Y-%m-%d %H:%M:%S')}[/cyan] vs [cyan]Current[/cyan] ({hours} hours back)")
+                window_note = f" ({hours} hours back)"
+        
+        self.console.print(f"Comparing: [cyan]{compare_time.strftime(DISPLAY_TIME_FORMAT)}[/cyan] vs [cyan]Current[/cyan]{window_note}")
         
         with Progress(
             SpinnerColumn(),
@@ -271,15 +312,10 @@ class FlightVaultCLI:
             BarColumn(),
             console=self.console
         ) as progress:
-            task = progress.add_task("diff", total=3)
-            
-            historical_data = self.engine.query_as_of(table, compare_time)
-            progress.advance(task)
-            
-            current_data = self.engine.query_current(table)
-            progress.advance(task)
+            task = progress.add_task("diff", total=1)
             
-            diff = self.engine.calculate_diff(historical_data, current_data, table)
+            # The server compares the snapshot with the current state, only changed rows come back
+            diff = self.engine.diff_between(table, compare_time)
             progress.advance(task)
         
         # Diff summary table
@@ -312,8 +348,7 @@ class FlightVaultCLI:
             # Show summary changes
             if diff['deleted']:
                 deleted_panel = Panel(
-                    "\n".join([f"• {record.get('name', f'ID {list(record.values())[0]}')}" 
-                              for record in diff['deleted'][:5]]) + 
+                    "\n".join([f"• {self._record_label(record)}" for record in diff['deleted'][:5]]) + 
                     (f"\n... and {len(diff['deleted']) - 5} more" if len(diff['deleted']) > 5 else ""),
                     title="[red]Deleted Records[/red]",
                     border_style="red"
@@ -322,8 +357,7 @@ class FlightVaultCLI:
             
             if diff['added']:
                 added_panel = Panel(
-                    "\n".join([f"• {record.get('name', f'ID {list(record.values())[0]}')}" 
-                              for record in diff['added'][:5]]) + 
+                    "\n".join([f"• {self._record_label(record)}" for record in diff['added'][:5]]) + 
                     (f"\n... and {len(diff['added']) - 5} more" if len(diff['added']) > 5 else ""),
                     title="[green]Added Records[/green]",
                     border_style="green"
@@ -340,6 +374,13 @@ class FlightVaultCLI:
         
         return diff
     
+    @staticmethod
+    def _record_label(record):
+        """Display name of a record, its first column (the primary key) when it has no name"""
+        if 'name' in record:
+            return record['name']
+        return f"ID {next(iter(record.values()))}"
+    
     def _show_detailed_diff(self, diff, table):
         self.console.print("\n[bold cyan]Detailed Record Comparison[/bold cyan]")
         
@@ -351,8 +392,8 @@ class FlightVaultCLI:
                 detail_table.add_column("Field", style="cyan")
                 detail_table.add_column("Value", style="red")
                 
-                for key, value in record.items():
-                    detail_table.add_row(str(key), str(value))
+                for row in [(str(key), str(value)) for key, value in record.items()]:
+                    detail_table.add_row(*row)
                 
                 self.console.print(detail_table)
         
@@ -364,8 +405,8 @@ class FlightVaultCLI:
                 detail_table.add_column("Field", style="cyan")
                 detail_table.add_column("Value", style="green")
                 
-                for key, value in record.items():
-                    detail_table.add_row(str(key), str(value))
+                for row in [(str(key), str(value)) for key, value in record.items()]:
+                    detail_table.add_row(*row)
                 
                 self.console.print(detail_table)
         
@@ -380,7 +421,7 @@ class FlightVaultCLI:
                 comparison_table = Table(
                     show_header=True, 
                     header_style="bold yellow", 
-                    title=f"Modified: {before_record.get('name', f'ID {list(before_record.values())[0]}')}'"
+                    title=f"Modified: {self._record_label(before_record)}'"
                 )
                 comparison_table.add_column("Field", style="cyan")
                 comparison_table.add_column("Before", style="red")
@@ -402,7 +443,7 @@ class FlightVaultCLI:
                 
                 self.console.print(comparison_table)
     
-    def intelligent_recovery(self, table='airports', dry_run=False, timestamp_str=None):
+    def intelligent_recovery(self, table='airports', dry_run=False, timestamp_str=None, disaster_type=None):
         self.console.print(f"\n[bold cyan]Intelligent Recovery[/bold cyan] for [yellow]{table}[/yellow]")
         
         if dry_run:
@@ -413,7 +454,7 @@ class FlightVaultCLI:
         
         # Algorithm execution
         if timestamp_str:
-            restore_timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            restore_timestamp = parse_iso_timestamp(timestamp_str)
             self.console.print(f"Using specified timestamp: [cyan]{restore_timestamp}[/cyan]")
             result = {
                 'optimal_timestamp': restore_timestamp,
@@ -432,12 +473,9 @@ class FlightVaultCLI:
             ) as progress:
                 task = progress.add_task("algorithm", total=100)
                 
-                # Simulate algorithm steps
-                for i in range(0, 101, 10):
-                    time.sleep(0.1)
-                    progress.update(task, completed=i)
-                
-                result = self.smart_finder.find_optimal_restore_point(table)
+                progress.update(task, completed=10)
+                result = self._find_restore_point(table, disaster_type)
+                progress.update(task, completed=100)
         
         # Results table
         results_table = Table(show_header=True, header_style="bold magenta")
@@ -446,7 +484,7 @@ class FlightVaultCLI:
         results_table.add_column("Assessment", style="dim")
         
         confidence = result['confidence_percentage']
-        confidence_color = "green" if confidence >= 80 else "yellow" if confidence >= 60 else "red"
+        color = confidence_color(confidence)
         
         results_table.add_row(
             "Optimal Timestamp",
@@ -455,7 +493,7 @@ class FlightVaultCLI:
         )
         results_table.add_row(
             "Confidence Level",
-            f"[{confidence_color}]{confidence}%[/{confidence_color}]",
+            f"[{color}]{confidence}%[/{color}]",
             "Statistical confidence"
         )
         results_table.add_row(
@@ -468,9 +506,12 @@ class FlightVaultCLI:
         
         # Recovery preview
         restore_timestamp = result['optimal_timestamp']
-        historical_data = self.engine.query_as_of(table, restore_timestamp)
-        current_data = self.engine.query_current(table)
-        diff = self.engine.calculate_diff(current_data, historical_data, table)
+        # The snapshot read and the server-side diff are independent, so the diff runs
+        # on a second pooled connection while this engine loads the snapshot
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            diff_future = executor.submit(self._diff_with_current, table, restore_timestamp)
+            historical_data = self.snapshots.query_as_of(table, restore_timestamp)
+            diff = diff_future.result()
         
         preview_panel = Panel(
             f"Records to restore: [yellow]{len(historical_data)}[/yellow]\n"
@@ -498,17 +539,16 @@ class FlightVaultCLI:
         ) as progress:
             task = progress.add_task("recovery", total=100)
             
-            for i in range(0, 101, 20):
-                time.sleep(0.1)
-                progress.update(task, completed=i)
-            
+            progress.update(task, completed=10)
             restore_result = self.engine.restore_records(table, historical_data)
+            self._restore_points.clear()
+            progress.update(task, completed=100)
         
         if restore_result['success']:
             success_panel = Panel(
                 f"[green]Recovery Successful![/green]\n"
                 f"Restored: [yellow]{restore_result['restored_count']}[/yellow] records\n"
-                f"Final count: [cyan]{len(self.engine.query_current(table))}[/cyan] records",
+                f"Final count: [cyan]{self.engine.count_current(table)}[/cyan] records",
                 title="Success",
                 border_style="green"
             )
@@ -523,7 +563,7 @@ class FlightVaultCLI:
         
         return result
     
-    def smart_algorithm_details(self, table='airports'):
+    def smart_algorithm_details(self, table='airports', disaster_type=None):
         self.console.print(f"\n[bold cyan]Smart Restore Algorithm Analysis[/bold cyan]")
         
         algorithm_panel = Panel(
@@ -543,12 +583,9 @@ class FlightVaultCLI:
         ) as progress:
             task = progress.add_task("analysis", total=100)
             
-            # Simulate algorithm analysis
-            for i in range(0, 101, 10):
-                time.sleep(0.1)
-                progress.update(task, completed=i)
-            
-            result = self.smart_finder.find_optimal_restore_point(table)
+            progress.update(task, completed=10)
+            result = self._find_restore_point(table, disaster_type)
+            progress.update(task, completed=100)
         
         # Algorithm steps table
         steps_table = Table(show_header=True, header_style="bold magenta")
@@ -559,7 +596,9 @@ class FlightVaultCLI:
         steps_table.add_row("1", "Binary Search Initialization", "Search window: 24 hours")
         steps_table.add_row("2", "Health Score Calculation", "Multi-factor validation")
         steps_table.add_row("3", "Boundary Detection", "Corruption onset identified")
-        steps_table.add_row("4", "Confidence Assessment", f"{result['confidence_percentage']}% confidence")
+        confidence = result['confidence_percentage']
+        color = confidence_color(confidence)
+        steps_table.add_row("4", "Confidence Assessment", f"[{color}]{confidence}%[/{color}] confidence")
         steps_table.add_row("5", "Optimal Point Selection", str(result['optimal_timestamp']))
         
         self.console.print(steps_table)
@@ -584,7 +623,7 @@ class FlightVaultCLI:
             task = progress.add_task("selective", total=100)
             
             # Get optimal restore point
-            result = self.smart_finder.find_optimal_restore_point(table)
+            result = self._find_restore_point(table)
             progress.update(task, completed=30)
             
             # Analyze changes
@@ -656,6 +695,7 @@ class FlightVaultCLI:
             execution_result = self.selective_engine.execute_selective_restore(
                 table, classification['restore_records'], validation
             )
+            self._restore_points.clear()
             progress.update(task, completed=100)
         
         if execution_result['success']:
@@ -689,16 +729,19 @@ def main():
     
     # Add interactive mode flag
     parser.add_argument('-i', '--interactive', action='store_true', help='Start interactive mode')
+    parser.add_argument('--cache', action='store_true', help='Reuse table reads for up to a minute (may show stale data while others write)')
     
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
     # Status command
     status_parser = subparsers.add_parser('status', help='System status check')
+    status_parser.set_defaults(handler=lambda args: cli.status_check())
     
     # Timeline command
     timeline_parser = subparsers.add_parser('timeline', help='Timeline explorer')
     timeline_parser.add_argument('--table', default='airports', choices=['airports', 'airlines', 'routes'])
     timeline_parser.add_argument('--hours', type=int, default=24, help='Hours to look back')
+    timeline_parser.set_defaults(handler=lambda args: cli.timeline_explorer(args.table, args.hours))
     
     # Diff command
     diff_parser = subparsers.add_parser('diff', help='Smart diff viewer')
@@ -706,6 +749,7 @@ def main():
     diff_parser.add_argument('--timestamp', help='Compare timestamp (ISO format)')
     diff_parser.add_argument('--hours', type=int, default=1, help='Hours to look back (default: 1)')
     diff_parser.add_argument('--detailed', action='store_true', help='Show detailed record-by-record comparison')
+    diff_parser.set_defaults(handler=lambda args: cli.smart_diff_viewer(args.table, args.timestamp, args.detailed, args.hours))
     
     # Recover command
     recover_parser = subparsers.add_parser('recover', help='Intelligent recovery')
@@ -713,39 +757,36 @@ def main():
     recover_parser.add_argument('--timestamp', help='Specific timestamp to restore (ISO format)')
     recover_parser.add_argument('--dry-run', action='store_true', help='Preview mode - no changes made')
     recover_parser.add_argument('--execute', action='store_true', help='Execute actual recovery')
+    recover_parser.add_argument('--disaster-type', choices=DISASTER_TYPES, help='Tune the restore point search to the disaster')
+    recover_parser.set_defaults(handler=lambda args: cli.intelligent_recovery(
+        args.table, args.dry_run or not args.execute, args.timestamp, args.disaster_type
+    ))
     
     # Algorithm command
     algorithm_parser = subparsers.add_parser('algorithm', help='Smart algorithm analysis')
     algorithm_parser.add_argument('--table', default='airports', choices=['airports', 'airlines', 'routes'])
+    algorithm_parser.add_argument('--disaster-type', choices=DISASTER_TYPES, help='Tune the restore point search to the disaster')
+    algorithm_parser.set_defaults(handler=lambda args: cli.smart_algorithm_details(args.table, args.disaster_type))
     
     # Selective command
     selective_parser = subparsers.add_parser('selective', help='Selective restore - surgical recovery')
     selective_parser.add_argument('--table', default='airports', choices=['airports', 'airlines', 'routes'])
     selective_parser.add_argument('--execute', action='store_true', help='Execute selective restore')
+    selective_parser.set_defaults(handler=lambda args: cli.selective_restore(args.table, args.execute))
     
     args = parser.parse_args()
     
     # Initialize CLI
-    if not cli.initialize():
+    if not cli.initialize(use_cache=args.cache):
         return
     
     try:
         # Check for interactive mode or no command
         if args.interactive or not args.command:
             cli.interactive_mode()
-        elif args.command == 'status':
-            cli.status_check()
-        elif args.command == 'timeline':
-            cli.timeline_explorer(args.table, args.hours)
-        elif args.command == 'diff':
-            cli.smart_diff_viewer(args.table, args.timestamp, getattr(args, 'detailed', False), getattr(args, 'hours', 1))
-        elif args.command == 'recover':
-            dry_run = args.dry_run or not args.execute
-            cli.intelligent_recovery(args.table, dry_run, args.timestamp)
-        elif args.command == 'algorithm':
-            cli.smart_algorithm_details(args.table)
-        elif args.command == 'selective':
-            cli.selective_restore(args.table, args.execute)
+        else:
+            # Each subcommand registers its own handler via set_defaults
+            args.handler(args)
     
     except KeyboardInterrupt:
         cli.console.print("\n[yellow]Operation cancelled by user[/yellow]")
@@ -10,6 +10,15 @@ DATABASE_CONFIG = {
     'database': os.getenv('DB_NAME', 'flightvault')
 }
 
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+
+# Comma separated list of browser origins allowed to call the API
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+    if origin.strip()
+]
+
 SETUP_CONFIG = {
     'user': 'root',
     'password': 'password',
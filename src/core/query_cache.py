@@ -0,0 +1,44 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+class QueryCache:
+    """
+    Time-limited LRU cache for idempotent table reads, keyed by (method, table, *args).
+    Entries for a table are dropped as soon as the table is written through the engine.
+    """
+    
+    def __init__(self, maxsize: int = 64, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple[Hashable, ...], default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, key: Tuple[Hashable, ...], value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, table: str):
+        """Drop every cached read of a table"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == table]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
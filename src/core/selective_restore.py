@@ -3,13 +3,106 @@ Selective Restore Engine - Surgical Recovery of Database Disasters
 Enables granular restoration of only corrupted data while preserving legitimate changes
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Set
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Tuple, Set
 from src.core.temporal_engine import TemporalEngine
 
+logger = logging.getLogger("FlightVault-SelectiveRestore")
+
+
+def compile_rules(rules: List[Dict]) -> Callable[[Dict], Optional[str]]:
+    """
+    Turn classification rules into one classifier that returns the action of the
+    first rule a change matches, or None. Each rule's conditions are resolved to
+    checks once here instead of being looked up again for every change.
+    """
+    
+    def rule_checks(rule: Dict) -> List[Callable[[Dict], bool]]:
+        checks = []
+        
+        change_type = rule.get('change_type')
+        if 'change_type' in rule:
+            checks.append(lambda change: change['type'] == change_type)
+        
+        if 'field_pattern' in rule:
+            pattern = rule['field_pattern']
+            checks.append(lambda change: change['type'] != 'modified' or any(
+                pattern in cf['field'] for cf in change['data']['changed_fields']
+            ))
+        
+        if 'time_range' in rule:
+            start_time, end_time = rule['time_range']
+            
+            def in_time_range(change: Dict) -> bool:
+                change_time = (change['data'].get('creation_timestamp') or 
+                               change['data'].get('modification_timestamp'))
+                return not change_time or start_time <= change_time <= end_time
+            
+            checks.append(in_time_range)
+        
+        return checks
+    
+    compiled = [(rule_checks(rule), rule['action']) for rule in rules]
+    
+    def classify(change: Dict) -> Optional[str]:
+        for checks, action in compiled:
+            if all(check(change) for check in checks):
+                return action
+        return None
+    
+    return classify
+
+
+# Column value types JSON cannot hold, tagged so a resumed restore binds the same types
+BIND_DECODERS = {
+    '__decimal__': Decimal,
+    '__datetime__': datetime.fromisoformat,
+    '__date__': date.fromisoformat,
+    '__bytes__': bytes.fromhex
+}
+
+def encode_bind_value(value):
+    """json.dumps default for the column values stored with a checkpointed restore"""
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': bytes(value).hex()}
+    raise TypeError(f"Cannot store {type(value).__name__} in a restore checkpoint")
+
+def decode_bind_values(obj: Dict):
+    """json.loads object_hook undoing encode_bind_value"""
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        decoder = BIND_DECODERS.get(tag)
+        if decoder is not None:
+            return decoder(value)
+    return obj
+
+
+@lru_cache(maxsize=64)
+def replace_statement(table: str, columns: Tuple[str, ...]) -> str:
+    """REPLACE statement for a column set, formatted once per table schema"""
+    placeholders = ', '.join(['%s' for _ in columns])
+    return f"REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
 class SelectiveRestoreEngine:
     """Engine for selective restoration of temporal data"""
     
+    # Fields whose modification the heuristic classifier treats as suspicious
+    CRITICAL_FIELDS = frozenset({'name', 'iata_code', 'price'})
+    
     def __init__(self, engine: TemporalEngine):
         self.engine = engine
     
@@ -19,60 +112,68 @@ class SelectiveRestoreEngine:
         Calculate comprehensive differences between historical and current states
         """
         
-        print(f"🔍 Analyzing changes between {restore_timestamp.strftime('%H:%M:%S')} and current state...")
-        
-        # Get both states
-        historical_data = self.engine.query_as_of(table, restore_timestamp)
-        current_data = self.engine.query_current(table)
+        # With a query cache, repeat analyses of an unchanged table are served from it.
+        # The change marker is part of the key, so writes made outside the engine
+        # miss the old entry too.
+        query_cache = self.engine.query_cache
+        if query_cache is None:
+            return self._analyze_changes(table, restore_timestamp)
+        
+        key = ('analyze_changes', table, restore_timestamp, self.engine.change_marker(table))
+        change_set = query_cache.get(key)
+        if change_set is None:
+            change_set = self._analyze_changes(table, restore_timestamp)
+            query_cache.put(key, change_set)
+        return change_set
+    
+    def _analyze_changes(self, table: str, restore_timestamp: datetime) -> Dict:
+        logger.info("Analyzing changes between %s and current state", restore_timestamp.strftime('%H:%M:%S'))
         
-        # Build lookup dictionaries
+        # Let the server diff the historical snapshot against the current state,
+        # only rows that changed come back
+        diff = self.engine.diff_between(table, restore_timestamp)
         pk_field = self.engine.tables[table]
-        historical_dict = {row[pk_field]: row for row in historical_data}
-        current_dict = {row[pk_field]: row for row in current_data}
-        
-        # Calculate changes
-        deleted_records = []  # In historical, not in current
-        added_records = []    # In current, not in historical  
-        modified_records = [] # In both but different
-        
-        # Find deleted records
-        for record_id, historical_record in historical_dict.items():
-            if record_id not in current_dict:
-                # Get deletion timestamp from audit trail
-                deletion_time = self._get_deletion_timestamp(table, record_id, restore_timestamp)
-                deleted_records.append({
-                    'id': record_id,
-                    'historical_data': historical_record,
-                    'deletion_timestamp': deletion_time
-                })
-        
-        # Find added records
-        for record_id, current_record in current_dict.items():
-            if record_id not in historical_dict:
-                # Get creation timestamp
-                creation_time = self._get_creation_timestamp(table, record_id)
-                added_records.append({
-                    'id': record_id,
-                    'current_data': current_record,
-                    'creation_timestamp': creation_time
-                })
-        
-        # Find modified records
-        for record_id in set(historical_dict.keys()) & set(current_dict.keys()):
-            historical_record = historical_dict[record_id]
-            current_record = current_dict[record_id]
-            
-            if self.engine._rows_different(historical_record, current_record):
-                changes = self.engine._get_field_changes(historical_record, current_record)
-                modification_time = self._get_modification_timestamp(table, record_id, restore_timestamp)
-                
-                modified_records.append({
-                    'id': record_id,
-                    'historical_data': historical_record,
-                    'current_data': current_record,
-                    'changed_fields': changes,
-                    'modification_timestamp': modification_time
-                })
+        
+        # One batched audit read for every changed record instead of one per record
+        changed_ids = {row[pk_field] for row in diff['deleted']}
+        changed_ids.update(row[pk_field] for row in diff['added'])
+        changed_ids.update(modification['before'][pk_field] for modification in diff['modified'])
+        deletion_times, creation_times, modification_times = self._change_timestamps(
+            table, changed_ids, restore_timestamp
+        )
+        
+        # Deleted records: in historical, not in current
+        deleted_records = []
+        for historical_record in diff['deleted']:
+            record_id = historical_record[pk_field]
+            deleted_records.append({
+                'id': record_id,
+                'historical_data': historical_record,
+                'deletion_timestamp': deletion_times.get(record_id)
+            })
+        
+        # Added records: in current, not in historical
+        added_records = []
+        for current_record in diff['added']:
+            record_id = current_record[pk_field]
+            added_records.append({
+                'id': record_id,
+                'current_data': current_record,
+                'creation_timestamp': creation_times.get(record_id)
+            })
+        
+        # Modified records: in both but different
+        modified_records = []
+        for modification in diff['modified']:
+            historical_record = modification['before']
+            record_id = historical_record[pk_field]
+            modified_records.append({
+                'id': record_id,
+                'historical_data': historical_record,
+                'current_data': modification['after'],
+                'changed_fields': modification['changes'],
+                'modification_timestamp': modification_times.get(record_id)
+            })
         
         change_set = {
             'deleted_records': deleted_records,
@@ -86,8 +187,9 @@ class SelectiveRestoreEngine:
             }
         }
         
-        print(f"   Found {change_set['summary']['total_changes']} total changes")
-        print(f"   Deleted: {len(deleted_records)}, Added: {len(added_records)}, Modified: {len(modified_records)}")
+        logger.info("Found %d total changes (deleted: %d, added: %d, modified: %d)", 
+                    change_set['summary']['total_changes'], 
+                    len(deleted_records), len(added_records), len(modified_records))
         
         return change_set
     
@@ -97,7 +199,7 @@ class SelectiveRestoreEngine:
         Categorize changes as 'legitimate' (keep) or 'corrupted' (restore)
         """
         
-        print(f"🎯 Classifying changes...")
+        logger.info("Classifying changes")
         
         classification = {
             'keep_records': [],      # Legitimate changes to preserve
@@ -112,9 +214,9 @@ class SelectiveRestoreEngine:
             # Use heuristic analysis
             classification = self._heuristic_analysis(change_set)
         
-        print(f"   Keep: {len(classification['keep_records'])}")
-        print(f"   Restore: {len(classification['restore_records'])}")
-        print(f"   Uncertain: {len(classification['uncertain_records'])}")
+        logger.info("Keep: %d, restore: %d, uncertain: %d", 
+                    len(classification['keep_records']), len(classification['restore_records']), 
+                    len(classification['uncertain_records']))
         
         return classification
     
@@ -124,7 +226,7 @@ class SelectiveRestoreEngine:
         Ensure selective restoration maintains referential integrity
         """
         
-        print(f"🔗 Validating dependencies...")
+        logger.info("Validating dependencies")
         
         validation_result = {
             'safe_to_restore': True,
@@ -140,19 +242,37 @@ class SelectiveRestoreEngine:
         elif table == 'routes':
             validation_result = self._validate_route_dependencies(restore_list)
         
-        print(f"   Safe to restore: {validation_result['safe_to_restore']}")
-        print(f"   Affected tables: {len(validation_result['affected_tables'])}")
+        logger.info("Safe to restore: %s, affected tables: %d", 
+                    validation_result['safe_to_restore'], len(validation_result['affected_tables']))
         
         return validation_result
     
     def execute_selective_restore(self, table: str, restore_list: List[Dict], 
-                                 validation_result: Dict) -> Dict:
+                                 validation_result: Dict, batch_size: int = 100,
+                                 verify_integrity: bool = True, checkpoint: bool = False) -> Dict:
         """
         Component 4: Transactional Restore Executor
-        Execute selective restoration with ACID guarantees
+        Execute selective restoration with ACID guarantees. Every batch runs on the
+        engine's connection inside one transaction; raise batch_size to cut the
+        number of round trips for large restore lists. verify_integrity runs a final
+        duplicate primary key scan of the table before committing.
+        
+        With checkpoint=True each batch commits on its own and progress is recorded
+        in restore_checkpoints, so a failed restore can be continued with
+        resume_selective_restore(restore_id) instead of starting over.
         """
         
-        print(f"🚀 Executing selective restore...")
+        logger.info("Executing selective restore")
+        
+        # Nothing to write back: skip the transaction and the final checks entirely
+        if not any(item['type'] in ('deleted', 'modified') for item in restore_list):
+            return {
+                'success': True,
+                'records_processed': 0,
+                'batches_completed': 0,
+                'execution_time': 0,
+                'errors': []
+            }
         
         if not validation_result['safe_to_restore']:
             return {
@@ -161,6 +281,9 @@ class SelectiveRestoreEngine:
                 'details': validation_result
             }
         
+        if checkpoint:
+            return self._execute_checkpointed(table, restore_list, batch_size, verify_integrity)
+        
         execution_result = {
             'success': False,
             'records_processed': 0,
@@ -176,12 +299,12 @@ class SelectiveRestoreEngine:
             self.engine.conn.begin()
             
             # Process in batches
-            batch_size = 100
             total_records = len(restore_list)
             batches = [restore_list[i:i + batch_size] for i in range(0, total_records, batch_size)]
+            rows_affected = 0
             
             for batch_num, batch in enumerate(batches, 1):
-                print(f"   Processing batch {batch_num}/{len(batches)} ({len(batch)} records)")
+                logger.debug("Processing batch %d/%d (%d records)", batch_num, len(batches), len(batch))
                 
                 # Execute batch restore
                 batch_result = self._execute_batch_restore(table, batch)
@@ -193,19 +316,25 @@ class SelectiveRestoreEngine:
                     return execution_result
                 
                 execution_result['records_processed'] += batch_result['records_processed']
+                rows_affected += batch_result['rows_affected']
                 execution_result['batches_completed'] += 1
                 
-                # Validate after each batch
-                if not self._validate_batch_integrity(table, batch):
+                # Cheap check after each batch: the server must report a row written for
+                # every restored record. The primary key makes duplicates impossible under
+                # REPLACE, so the full-table duplicate scan only runs once at the end.
+                expected_count = sum(1 for item in batch if item['type'] in ('deleted', 'modified'))
+                if batch_result['rows_affected'] < expected_count:
                     self.engine.conn.rollback()
                     execution_result['errors'].append(f"Integrity check failed after batch {batch_num}")
                     return execution_result
             
             # Final validation
-            if self._final_validation_check(table, restore_list):
+            if self._final_validation_check(table, restore_list, rows_affected, 
+                                            verify_integrity=verify_integrity):
                 self.engine.conn.commit()
+                self.engine.invalidate_cache(table)
                 execution_result['success'] = True
-                print(f"   ✅ Selective restore completed successfully")
+                logger.info("Selective restore completed successfully")
             else:
                 self.engine.conn.rollback()
                 execution_result['errors'].append("Final validation failed")
@@ -218,57 +347,183 @@ class SelectiveRestoreEngine:
         
         return execution_result
     
-    def _get_deletion_timestamp(self, table: str, record_id: int, after_timestamp: datetime) -> Optional[datetime]:
-        """Get when a record was deleted"""
+    def resume_selective_restore(self, restore_id: str, verify_integrity: bool = True) -> Dict:
+        """Continue a checkpointed restore from the first batch that did not commit"""
+        
+        self.engine.cursor.execute("""
+            SELECT table_name, batch_size, last_batch, status, records 
+            FROM restore_checkpoints 
+            WHERE restore_id = %s
+        """, (restore_id,))
+        checkpoint = self.engine.cursor.fetchone()
+        
+        if checkpoint is None or checkpoint['status'] == 'COMPLETED':
+            return {
+                'success': checkpoint is not None,
+                'restore_id': restore_id,
+                'table': checkpoint['table_name'] if checkpoint is not None else None,
+                'records_processed': 0,
+                'batches_completed': 0,
+                'execution_time': 0,
+                'errors': [] if checkpoint is not None else [f"Unknown restore {restore_id}"]
+            }
+        
+        table = checkpoint['table_name']
+        records = json.loads(checkpoint['records'], object_hook=decode_bind_values)
+        
+        # The data may have changed since the restore stopped, so check the rest of it again
+        remaining = records[checkpoint['last_batch'] * checkpoint['batch_size']:]
+        validation_result = self.validate_dependencies(table, remaining)
+        if not validation_result['safe_to_restore']:
+            return {
+                'success': False,
+                'restore_id': restore_id,
+                'table': table,
+                'records_processed': 0,
+                'batches_completed': 0,
+                'execution_time': 0,
+                'errors': ['Validation failed - resume aborted'] + validation_result['foreign_key_issues']
+            }
+        
+        logger.info("Resuming selective restore %s at batch %d", restore_id, checkpoint['last_batch'] + 1)
+        self._mark_checkpoint(restore_id, 'RUNNING')
+        return self._run_checkpointed(
+            restore_id, table, records, checkpoint['batch_size'], checkpoint['last_batch'], verify_integrity
+        )
+    
+    def _execute_checkpointed(self, table: str, restore_list: List[Dict], batch_size: int,
+                              verify_integrity: bool) -> Dict:
+        """Record a new checkpointed restore and run it from the first batch"""
+        
+        # Keep only what the batches write back, so a resume does not need the change set
+        ignore_keys = self.engine.IGNORE_KEYS
+        records = [
+            {
+                'type': item['type'],
+                'data': {
+                    'id': item['data']['id'],
+                    'historical_data': {k: v for k, v in item['data']['historical_data'].items()
+                                        if k not in ignore_keys}
+                }
+            }
+            for item in restore_list if item['type'] in ('deleted', 'modified')
+        ]
+        
+        restore_id = uuid.uuid4().hex
+        self.engine.cursor.execute("""
+            INSERT INTO restore_checkpoints (restore_id, table_name, batch_size, last_batch, status, records)
+            VALUES (%s, %s, %s, 0, 'RUNNING', %s)
+        """, (restore_id, table, batch_size, json.dumps(records, default=encode_bind_value)))
+        self.engine.conn.commit()
+        
+        return self._run_checkpointed(restore_id, table, records, batch_size, 0, verify_integrity)
+    
+    def _run_checkpointed(self, restore_id: str, table: str, restore_list: List[Dict], 
+                          batch_size: int, start_batch: int, verify_integrity: bool) -> Dict:
+        """Run batches from start_batch, committing each one together with its checkpoint"""
+        
+        execution_result = {
+            'success': False,
+            'restore_id': restore_id,
+            'table': table,
+            'records_processed': 0,
+            'batches_completed': 0,
+            'execution_time': 0,
+            'errors': []
+        }
+        
+        start_time = datetime.now()
+        batches = [restore_list[i:i + batch_size] for i in range(0, len(restore_list), batch_size)]
+        
         try:
-            audit_trail = self.engine.get_audit_trail(table, limit=1000)
-            pk_field = self.engine.tables[table]
+            for batch_num in range(start_batch, len(batches)):
+                batch = batches[batch_num]
+                logger.debug("Processing batch %d/%d (%d records)", batch_num + 1, len(batches), len(batch))
+                
+                self.engine.conn.begin()
+                batch_result = self._execute_batch_restore(table, batch)
+                
+                if not batch_result['success'] or batch_result['rows_affected'] < len(batch):
+                    # Only this batch is lost, earlier batches stay committed
+                    self.engine.conn.rollback()
+                    self._mark_checkpoint(restore_id, 'FAILED')
+                    execution_result['errors'].extend(
+                        batch_result['errors'] or [f"Integrity check failed after batch {batch_num + 1}"]
+                    )
+                    return execution_result
+                
+                # The checkpoint moves in the same transaction as the batch it records
+                self.engine.cursor.execute(
+                    "UPDATE restore_checkpoints SET last_batch = %s WHERE restore_id = %s",
+                    (batch_num + 1, restore_id)
+                )
+                self.engine.conn.commit()
+                
+                execution_result['records_processed'] += batch_result['records_processed']
+                execution_result['batches_completed'] += 1
             
-            for entry in audit_trail:
-                if (entry.get(pk_field) == record_id and 
-                    entry['status'] == 'HISTORICAL' and
-                    entry['changed_at'] > after_timestamp):
-                    return entry['valid_until']
+            if verify_integrity and not self._validate_integrity(table):
+                self._mark_checkpoint(restore_id, 'FAILED')
+                execution_result['errors'].append("Final validation failed")
+                return execution_result
             
-            return None
-        except:
-            return None
+            self._mark_checkpoint(restore_id, 'COMPLETED')
+            execution_result['success'] = True
+            logger.info("Selective restore %s completed successfully", restore_id)
+            
+        except Exception as e:
+            self.engine.conn.rollback()
+            self._mark_checkpoint(restore_id, 'FAILED')
+            execution_result['errors'].append(str(e))
+        
+        finally:
+            # Committed batches changed the table even when a later one failed
+            if execution_result['batches_completed']:
+                self.engine.invalidate_cache(table)
+            execution_result['execution_time'] = (datetime.now() - start_time).total_seconds()
+        
+        return execution_result
     
-    def _get_creation_timestamp(self, table: str, record_id: int) -> Optional[datetime]:
-        """Get when a record was created"""
+    def _mark_checkpoint(self, restore_id: str, status: str):
+        """Record the outcome of a checkpointed restore in its own transaction"""
         try:
-            audit_trail = self.engine.get_audit_trail(table, limit=1000)
-            pk_field = self.engine.tables[table]
-            
-            # Find earliest entry for this record
-            record_entries = [entry for entry in audit_trail if entry.get(pk_field) == record_id]
-            if record_entries:
-                earliest = min(record_entries, key=lambda x: x['changed_at'])
-                return earliest['changed_at']
-            
-            return None
-        except:
-            return None
+            self.engine.cursor.execute(
+                "UPDATE restore_checkpoints SET status = %s WHERE restore_id = %s",
+                (status, restore_id)
+            )
+            self.engine.conn.commit()
+        except Exception as e:
+            logger.warning("Could not mark restore %s as %s: %s", restore_id, status, e)
     
-    def _get_modification_timestamp(self, table: str, record_id: int, after_timestamp: datetime) -> Optional[datetime]:
-        """Get when a record was last modified after given timestamp"""
+    def _change_timestamps(self, table: str, record_ids: Set, 
+                           after_timestamp: datetime) -> Tuple[Dict, Dict, Dict]:
+        """
+        When each record was deleted, created and last modified after the given timestamp,
+        looked up in the engine's timeline index of versions started since then
+        """
+        deletion_times, creation_times, modification_times = {}, {}, {}
+        if not record_ids:
+            return deletion_times, creation_times, modification_times
+        
         try:
-            audit_trail = self.engine.get_audit_trail(table, limit=1000)
-            pk_field = self.engine.tables[table]
-            
-            modifications = [
-                entry for entry in audit_trail 
-                if (entry.get(pk_field) == record_id and 
-                    entry['changed_at'] > after_timestamp)
-            ]
+            timeline = self.engine.get_timeline_index(table, since=after_timestamp)
+        except Exception:
+            return deletion_times, creation_times, modification_times
+        
+        for record_id in record_ids:
+            versions = timeline.get(record_id)
+            if not versions:
+                continue
             
-            if modifications:
-                latest = max(modifications, key=lambda x: x['changed_at'])
-                return latest['changed_at']
-            
-            return None
-        except:
-            return None
+            # Versions are oldest first and all started after the timestamp
+            creation_times[record_id] = versions[0][0]
+            modification_times[record_id] = versions[-1][0]
+            for changed_at, valid_until, status in reversed(versions):
+                if status == 'HISTORICAL':
+                    deletion_times[record_id] = valid_until
+                    break
+        
+        return deletion_times, creation_times, modification_times
     
     def _apply_rules(self, change_set: Dict, rules: List[Dict]) -> Dict:
         """Apply user-defined rules for classification"""
@@ -278,53 +533,27 @@ class SelectiveRestoreEngine:
             'restore_records': [],
             'uncertain_records': []
         }
+        buckets = {
+            'keep': classification['keep_records'],
+            'restore': classification['restore_records'],
+            None: classification['uncertain_records']
+        }
         
-        # Process each type of change
-        all_changes = (
-            [{'type': 'deleted', 'data': r} for r in change_set['deleted_records']] +
-            [{'type': 'added', 'data': r} for r in change_set['added_records']] +
-            [{'type': 'modified', 'data': r} for r in change_set['modified_records']]
+        # Process each type of change, tagged lazily so no merged list is built
+        all_changes = chain(
+            ({'type': 'deleted', 'data': r} for r in change_set['deleted_records']),
+            ({'type': 'added', 'data': r} for r in change_set['added_records']),
+            ({'type': 'modified', 'data': r} for r in change_set['modified_records'])
         )
         
+        classify = compile_rules(rules)
         for change in all_changes:
-            matched_rule = False
-            
-            for rule in rules:
-                if self._matches_rule(change, rule):
-                    if rule['action'] == 'keep':
-                        classification['keep_records'].append(change)
-                    elif rule['action'] == 'restore':
-                        classification['restore_records'].append(change)
-                    matched_rule = True
-                    break
-            
-            if not matched_rule:
-                classification['uncertain_records'].append(change)
+            bucket = buckets.get(classify(change))
+            if bucket is not None:
+                bucket.append(change)
         
         return classification
     
-    def _matches_rule(self, change: Dict, rule: Dict) -> bool:
-        """Check if a change matches a classification rule"""
-        
-        # Simple rule matching - can be extended
-        if 'change_type' in rule and change['type'] != rule['change_type']:
-            return False
-        
-        if 'field_pattern' in rule:
-            if change['type'] == 'modified':
-                changed_fields = [cf['field'] for cf in change['data']['changed_fields']]
-                if not any(rule['field_pattern'] in field for field in changed_fields):
-                    return False
-        
-        if 'time_range' in rule:
-            change_time = change['data'].get('creation_timestamp') or change['data'].get('modification_timestamp')
-            if change_time:
-                start_time, end_time = rule['time_range']
-                if not (start_time <= change_time <= end_time):
-                    return False
-        
-        return True
-    
     def _heuristic_analysis(self, change_set: Dict) -> Dict:
         """Automatic heuristic-based classification"""
         
@@ -352,13 +581,11 @@ class SelectiveRestoreEngine:
                 classification['uncertain_records'].append({'type': 'deleted', 'data': deleted_record})
         
         # Heuristic 3: Modifications to critical fields are suspicious
+        critical_fields = self.CRITICAL_FIELDS
         for modified_record in change_set['modified_records']:
-            critical_fields_changed = any(
-                change['field'] in ['name', 'iata_code', 'price'] 
-                for change in modified_record['changed_fields']
-            )
+            changed_names = {change['field'] for change in modified_record['changed_fields']}
             
-            if critical_fields_changed:
+            if not critical_fields.isdisjoint(changed_names):
                 classification['restore_records'].append({'type': 'modified', 'data': modified_record})
             else:
                 classification['keep_records'].append({'type': 'modified', 'data': modified_record})
@@ -408,25 +635,27 @@ class SelectiveRestoreEngine:
         # Check if airports and airlines exist for restored routes
         route_records = [item['data'] for item in restore_list if item['type'] in ['deleted', 'modified']]
         
-        for route_data in route_records:
-            if 'historical_data' in route_data:
-                route = route_data['historical_data']
-                
-                # Check if referenced airports exist
-                source_id = route.get('source_airport_id')
-                dest_id = route.get('destination_airport_id')
-                
-                if source_id or dest_id:
-                    current_airports = self.engine.query_current('airports')
-                    airport_ids = {apt['airport_id'] for apt in current_airports}
-                    
-                    if source_id and source_id not in airport_ids:
-                        validation['foreign_key_issues'].append(f"Route references non-existent source airport {source_id}")
-                        validation['safe_to_restore'] = False
-                    
-                    if dest_id and dest_id not in airport_ids:
-                        validation['foreign_key_issues'].append(f"Route references non-existent destination airport {dest_id}")
-                        validation['safe_to_restore'] = False
+        routes = [route_data['historical_data'] for route_data in route_records 
+                  if 'historical_data' in route_data]
+        
+        # Let the server check the referenced airports, only the missing ones come back
+        referenced_ids = {route.get('source_airport_id') for route in routes}
+        referenced_ids.update(route.get('destination_airport_id') for route in routes)
+        referenced_ids.discard(None)
+        missing_airports = self.engine.missing_keys('airports', referenced_ids)
+        
+        for route in routes:
+            # Check if referenced airports exist
+            source_id = route.get('source_airport_id')
+            dest_id = route.get('destination_airport_id')
+            
+            if source_id and source_id in missing_airports:
+                validation['foreign_key_issues'].append(f"Route references non-existent source airport {source_id}")
+                validation['safe_to_restore'] = False
+            
+            if dest_id and dest_id in missing_airports:
+                validation['foreign_key_issues'].append(f"Route references non-existent destination airport {dest_id}")
+                validation['safe_to_restore'] = False
         
         return validation
     
@@ -435,42 +664,32 @@ class SelectiveRestoreEngine:
         
         try:
             records_processed = 0
+            rows_affected = 0
+            ignore_keys = self.engine.IGNORE_KEYS
             
+            # Deleted and modified records both go back to their historical version.
+            # Group them by column set so each group is one REPLACE sent with executemany.
+            groups = defaultdict(list)
             for item in batch:
-                change_type = item['type']
-                change_data = item['data']
-                
-                if change_type == 'deleted':
-                    # Restore deleted record
-                    historical_data = change_data['historical_data']
-                    clean_record = {k: v for k, v in historical_data.items() 
-                                  if k not in ['ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status']}
-                    
-                    columns = ', '.join(clean_record.keys())
-                    placeholders = ', '.join(['%s' for _ in clean_record])
-                    query = f"REPLACE INTO {table} ({columns}) VALUES ({placeholders})"
-                    
-                    self.engine.cursor.execute(query, list(clean_record.values()))
-                    records_processed += 1
-                
-                elif change_type == 'modified':
-                    # Restore to historical version
-                    historical_data = change_data['historical_data']
+                if item['type'] in ('deleted', 'modified'):
+                    historical_data = item['data']['historical_data']
                     clean_record = {k: v for k, v in historical_data.items() 
-                                  if k not in ['ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status']}
-                    
-                    columns = ', '.join(clean_record.keys())
-                    placeholders = ', '.join(['%s' for _ in clean_record])
-                    query = f"REPLACE INTO {table} ({columns}) VALUES ({placeholders})"
+                                  if k not in ignore_keys}
                     
-                    self.engine.cursor.execute(query, list(clean_record.values()))
-                    records_processed += 1
+                    column_set = tuple(clean_record)
+                    groups[column_set].append(tuple(clean_record.values()))
                 
                 # Note: 'added' records in restore_list would be deleted, but that's rare in selective restore
             
+            for column_set, rows in groups.items():
+                self.engine.cursor.executemany(replace_statement(table, column_set), rows)
+                records_processed += len(rows)
+                rows_affected += self.engine.cursor.rowcount
+            
             return {
                 'success': True,
                 'records_processed': records_processed,
+                'rows_affected': rows_affected,
                 'errors': []
             }
             
@@ -478,11 +697,12 @@ class SelectiveRestoreEngine:
             return {
                 'success': False,
                 'records_processed': records_processed,
+                'rows_affected': rows_affected,
                 'errors': [str(e)]
             }
     
-    def _validate_batch_integrity(self, table: str, batch: List[Dict]) -> bool:
-        """Validate integrity after batch execution"""
+    def _validate_integrity(self, table: str) -> bool:
+        """Validate that the restored table has no duplicate primary keys"""
         
         try:
             # Basic check: ensure no duplicate primary keys
@@ -501,32 +721,24 @@ class SelectiveRestoreEngine:
         except:
             return False
     
-    def _final_validation_check(self, table: str, restore_list: List[Dict]) -> bool:
+    def _final_validation_check(self, table: str, restore_list: List[Dict], rows_affected: int,
+                                verify_integrity: bool = True) -> bool:
         """Final validation after complete restore"""
         
         try:
+            if verify_integrity and not self._validate_integrity(table):
+                return False
+            
             # Check that all expected records exist
             expected_ids = set()
             for item in restore_list:
                 if item['type'] in ['deleted', 'modified']:
                     expected_ids.add(item['data']['id'])
             
-            if expected_ids:
-                pk_field = self.engine.tables[table]
-                placeholders = ', '.join(['%s' for _ in expected_ids])
-                
-                self.engine.cursor.execute(f"""
-                    SELECT COUNT(*) as count 
-                    FROM {table} 
-                    WHERE {pk_field} IN ({placeholders})
-                """, list(expected_ids))
-                
-                result = self.engine.cursor.fetchone()
-                actual_count = result['count'] if result else 0
-                
-                return actual_count == len(expected_ids)
-            
-            return True
+            # The REPLACEs already reported what they wrote, so compare against the
+            # server's affected row count instead of querying the records back.
+            # A REPLACE counts 1 per inserted row and 2 per replaced one.
+            return rows_affected >= len(expected_ids)
             
         except:
             return False
\ No newline at end of file
@@ -1,13 +1,41 @@
 import mariadb
+import threading
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from operator import itemgetter
+from typing import Collection, Iterator, List, Dict, Optional, Set, Tuple
+from src.core.query_cache import QueryCache
 
 class TemporalEngine:
     
-    def __init__(self, config: Dict):
+    # Versioning and audit columns that are not part of a record's data
+    IGNORE_KEYS = frozenset({'ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status'})
+    
+    # Projection shared by the audit queries, ROW_END of a current row is the max timestamp
+    AUDIT_COLUMNS = """
+        *, 
+        ROW_START as changed_at,
+        ROW_END as valid_until,
+        CASE 
+            WHEN ROW_END = TIMESTAMP'2038-01-19 03:14:07.999999' 
+            THEN 'CURRENT'
+            ELSE 'HISTORICAL'
+        END as status
+    """
+    
+    # Bucket sizes audit_histogram accepts, mapped to SQL interval units
+    HISTOGRAM_UNITS = {'second': 'SECOND', 'minute': 'MINUTE', 'hour': 'HOUR', 'day': 'DAY'}
+    
+    def __init__(self, config: Dict, pool: Optional[mariadb.ConnectionPool] = None,
+                 query_cache: Optional[QueryCache] = None):
         self.config = config
-        self.conn = mariadb.connect(**config)
-        self.cursor = self.conn.cursor(dictionary=True)
+        self.conn = self._connect(config, pool)
+        # Optional result cache for unfiltered query_current/query_as_of reads
+        self.query_cache = query_cache
+        # Prepared cursor so repeated statements reuse the server-side plan
+        self.cursor = self.conn.cursor(dictionary=True, prepared=True)
+        # Tuple cursor for bulk snapshot reads, skips building a dict per row
+        self.row_cursor = self.conn.cursor(prepared=True)
         
         self.tables = {
             'airports': 'airport_id',
@@ -16,18 +44,157 @@ class TemporalEngine:
         }
     
     def query_as_of(self, table: str, timestamp: datetime, filters: Optional[Dict] = None) -> List[Dict]:
-        query = f"SELECT * FROM {table} FOR SYSTEM_TIME AS OF '{timestamp.strftime('%Y-%m-%d %H:%M:%S')}'"
+        self._check_table(table)
+        if self.query_cache is not None and not filters:
+            key = ('query_as_of', table, self._time_param(timestamp))
+            rows = self.query_cache.get(key)
+            if rows is None:
+                rows = self._query_as_of(table, timestamp)
+                self.query_cache.put(key, rows)
+            return rows
+        return self._query_as_of(table, timestamp, filters)
+    
+    def _query_as_of(self, table: str, timestamp: datetime, filters: Optional[Dict] = None) -> List[Dict]:
+        query = f"SELECT * FROM {table} FOR SYSTEM_TIME AS OF %s"
+        params = [self._time_param(timestamp)]
         
         if filters:
             where_clauses = [f"{key} = %s" for key in filters.keys()]
             query += " WHERE " + " AND ".join(where_clauses)
-            self.cursor.execute(query, list(filters.values()))
-        else:
-            self.cursor.execute(query)
+            params.extend(filters.values())
         
+        self.cursor.execute(query, params)
         return self.cursor.fetchall()
     
+    def query_as_of_page(self, table: str, timestamp: datetime, limit: int, 
+                         offset: int = 0) -> Tuple[List[Dict], bool]:
+        """
+        One page of an AS OF snapshot in primary key order, plus whether more rows follow.
+        Fetches a single extra row to answer that instead of counting.
+        """
+        self._check_table(table)
+        query = f"""
+            SELECT * FROM {table} FOR SYSTEM_TIME AS OF %s 
+            ORDER BY {self.tables[table]} 
+            LIMIT %s OFFSET %s
+        """
+        self.cursor.execute(query, (self._time_param(timestamp), int(limit) + 1, int(offset)))
+        rows = self.cursor.fetchall()
+        return rows[:limit], len(rows) > limit
+    
+    def count_as_of(self, table: str, timestamp: datetime) -> int:
+        """Row count of an AS OF snapshot, counted by the server"""
+        self._check_table(table)
+        self.cursor.execute(
+            f"SELECT COUNT(*) AS row_count FROM {table} FOR SYSTEM_TIME AS OF %s", 
+            (self._time_param(timestamp),)
+        )
+        return self.cursor.fetchone()['row_count']
+    
+    def count_current(self, table: str) -> int:
+        """Row count of the current state, counted by the server"""
+        self._check_table(table)
+        self.cursor.execute(f"SELECT COUNT(*) AS row_count FROM {table}")
+        return self.cursor.fetchone()['row_count']
+    
+    def change_marker(self, table: str) -> Tuple:
+        """
+        Cheap token that changes whenever the table does: version count, current row
+        count and latest version start. Updates and inserts add a version, deletes
+        drop the current count, so callers can key derived results on it.
+        """
+        self._check_table(table)
+        self.row_cursor.execute(f"""
+            SELECT 
+                (SELECT COUNT(*) FROM {table} FOR SYSTEM_TIME ALL),
+                (SELECT COUNT(*) FROM {table}),
+                (SELECT MAX(ROW_START) FROM {table} FOR SYSTEM_TIME ALL)
+        """)
+        return tuple(self.row_cursor.fetchone())
+    
+    def missing_keys(self, table: str, keys: Collection) -> Set:
+        """
+        Which of the given primary keys have no current row. The candidate keys are
+        anti-joined against the table on the server, so only the missing ones come back.
+        """
+        self._check_table(table)
+        pk = self.tables[table]
+        keys = list(set(keys))
+        missing = set()
+        
+        # Bound each statement so a large key list stays within the placeholder limit
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            candidates = ' UNION ALL '.join(['SELECT %s AS id'] * len(chunk))
+            self.row_cursor.execute(f"""
+                SELECT c.id FROM ({candidates}) c
+                LEFT JOIN {table} t ON t.{pk} = c.id
+                WHERE t.{pk} IS NULL
+            """, tuple(chunk))
+            missing.update(row[0] for row in self.row_cursor)
+        
+        return missing
+    
+    def multi_table_summary(self, tables: Optional[List[str]] = None, 
+                            recent_limit: int = 10) -> Dict[str, Dict]:
+        """
+        Current row count, number of recent versions (capped at recent_limit, like
+        len(get_audit_trail(table, recent_limit))) and last change time for each
+        table, all from a single UNION ALL round trip.
+        """
+        tables = list(tables or self.tables)
+        selects = []
+        for table in tables:
+            self._check_table(table)
+            selects.append(f"""
+                SELECT 
+                    '{table}' AS table_name,
+                    (SELECT COUNT(*) FROM {table}) AS current_count,
+                    (SELECT COUNT(*) FROM (
+                        SELECT 1 FROM {table} FOR SYSTEM_TIME ALL LIMIT %s
+                    ) AS recent) AS recent_changes,
+                    (SELECT MAX(ROW_START) FROM {table} FOR SYSTEM_TIME ALL) AS last_change
+            """)
+        self.cursor.execute(" UNION ALL ".join(selects), (int(recent_limit),) * len(tables))
+        return {row.pop('table_name'): row for row in self.cursor.fetchall()}
+    
+    def query_as_of_batch(self, table: str, timestamps: List[datetime]) -> Dict[datetime, List[Dict]]:
+        """Resolve several AS OF snapshots from a single temporal scan"""
+        if not timestamps:
+            return {}
+        
+        # Apply the same second precision query_as_of binds with
+        bounds = {ts: self._time_param(ts) for ts in timestamps}
+        snapshots = {ts: [] for ts in timestamps}
+        
+        # Stream the versions in chunks and place each into every snapshot it was valid for.
+        # ROW_START/ROW_END are projected last, so the record is every column before them.
+        query, params = self._between_query(table, min(bounds.values()), max(bounds.values()), 
+                                            include_versioning=True)
+        for columns, rows in self._stream_batches(query, 1000, params):
+            data_columns = columns[:-2]
+            for row in rows:
+                row_start, row_end = row[-2], row[-1]
+                record = None
+                for ts, bound in bounds.items():
+                    if row_start <= bound < row_end:
+                        if record is None:
+                            record = dict(zip(data_columns, row))
+                        snapshots[ts].append(record)
+        return snapshots
+    
     def query_current(self, table: str, filters: Optional[Dict] = None) -> List[Dict]:
+        self._check_table(table)
+        if self.query_cache is not None and not filters:
+            key = ('query_current', table)
+            rows = self.query_cache.get(key)
+            if rows is None:
+                rows = self._query_current(table)
+                self.query_cache.put(key, rows)
+            return rows
+        return self._query_current(table, filters)
+    
+    def _query_current(self, table: str, filters: Optional[Dict] = None) -> List[Dict]:
         query = f"SELECT * FROM {table}"
         
         if filters:
@@ -39,53 +206,279 @@ class TemporalEngine:
         
         return self.cursor.fetchall()
     
-    def query_between(self, table: str, start_time: datetime, end_time: datetime) -> List[Dict]:
+    def query_between(self, table: str, start_time: datetime, end_time: datetime, 
+                      include_versioning: bool = False) -> List[Dict]:
+        """Every row version in the window, with ROW_START/ROW_END only when asked for"""
+        self.cursor.execute(*self._between_query(table, start_time, end_time, include_versioning))
+        return self.cursor.fetchall()
+    
+    def iter_between(self, table: str, start_time: datetime, end_time: datetime, 
+                     include_versioning: bool = False, batch_size: int = 1000) -> Iterator[Dict]:
+        """Streaming variant of query_between"""
+        query, params = self._between_query(table, start_time, end_time, include_versioning)
+        return self._stream(query, batch_size, params)
+    
+    def get_audit_trail(self, table: str, limit: int = 1000, before: Optional[Dict] = None,
+                        start_time: Optional[datetime] = None, 
+                        end_time: Optional[datetime] = None) -> List[Dict]:
+        """
+        Newest-first change history. Pass the last entry of a page as `before`
+        to fetch the next page with an index seek instead of an OFFSET scan, and
+        start_time/end_time to only get changes made within that window.
+        """
+        query, params = self._audit_trail_query(table, limit, before, start_time, end_time)
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+    
+    def iter_audit_trail(self, table: str, limit: int = 1000, before: Optional[Dict] = None,
+                         start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                         batch_size: int = 1000) -> Iterator[Dict]:
+        """Streaming variant of get_audit_trail, newest change first"""
+        query, params = self._audit_trail_query(table, limit, before, start_time, end_time)
+        return self._stream(query, batch_size, params)
+    
+    def iter_change_times(self, table: str, limit: int = 1000, start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[datetime]:
+        """
+        Just the changed_at of each entry iter_audit_trail would yield, for callers that
+        only count or bucket changes and do not need a dict per row version.
+        """
+        query, params = self._audit_trail_query(table, limit, None, start_time, end_time, 
+                                                projection='ROW_START')
+        batches = self._stream_batches(query, batch_size, params)
+        try:
+            for _, rows in batches:
+                for row in rows:
+                    yield row[0]
+        finally:
+            batches.close()
+    
+    def get_timeline_index(self, table: str, 
+                           since: Optional[datetime] = None) -> Dict[object, List[Tuple[datetime, datetime, str]]]:
+        """
+        Every version of each record as pk -> [(changed_at, valid_until, status), ...],
+        oldest first, optionally only versions started after `since`. Built from one
+        lean ordered scan, so per-record lookups for a restore are dict probes instead
+        of audit-trail scans.
+        """
+        self._check_table(table)
+        pk = self.tables[table]
+        query = f"""
+            SELECT 
+                {pk}, ROW_START, ROW_END,
+                CASE 
+                    WHEN ROW_END = TIMESTAMP'2038-01-19 03:14:07.999999' 
+                    THEN 'CURRENT'
+                    ELSE 'HISTORICAL'
+                END
+            FROM {table} FOR SYSTEM_TIME ALL
+            {'' if since is None else 'WHERE ROW_START > %s'}
+            ORDER BY {pk}, ROW_START
+        """
+        params = () if since is None else (self._time_param(since),)
+        
+        index = {}
+        for _, rows in self._stream_batches(query, 1000, params):
+            for record_id, changed_at, valid_until, status in rows:
+                versions = index.get(record_id)
+                if versions is None:
+                    versions = index[record_id] = []
+                versions.append((changed_at, valid_until, status))
+        
+        return index
+    
+    def timeline_buckets(self, table: str, start_time: datetime, sample_size: int = 10) -> List[Dict]:
+        """
+        Changes since start_time grouped by minute, oldest minute first. Each bucket
+        carries its full change count and its newest `sample_size` audit entries,
+        so only the sampled rows leave the server.
+        """
+        self._check_table(table)
+        pk = self.tables[table]
+        
+        query = f"""
+            SELECT ranked.*
+            FROM (
+                SELECT versions.*,
+                       ROW_NUMBER() OVER (PARTITION BY period ORDER BY changed_at DESC, {pk} DESC) AS period_rank,
+                       COUNT(*) OVER (PARTITION BY period) AS period_count
+                FROM (
+                    SELECT {self.AUDIT_COLUMNS},
+                           TIMESTAMPADD(MINUTE, TIMESTAMPDIFF(MINUTE, TIMESTAMP'2000-01-01 00:00:00', ROW_START),
+                                        TIMESTAMP'2000-01-01 00:00:00') AS period
+                    FROM {table}
+                    FOR SYSTEM_TIME ALL
+                    WHERE ROW_START >= %s
+                ) versions
+            ) ranked
+            WHERE period_rank <= %s
+            ORDER BY period, period_rank
+        """
+        self.cursor.execute(query, (self._time_param(start_time), int(sample_size)))
+        
+        buckets = []
+        for row in self.cursor.fetchall():
+            period = row.pop('period')
+            change_count = row.pop('period_count')
+            del row['period_rank']
+            if not buckets or buckets[-1]['period'] != period:
+                buckets.append({'period': period, 'change_count': change_count, 'changes': []})
+            buckets[-1]['changes'].append(row)
+        return buckets
+    
+    def audit_histogram(self, table: str, start_time: datetime, bucket: str = 'minute', 
+                        limit: int = 10) -> Tuple[List[Tuple[datetime, int]], int]:
+        """
+        Change counts per bucket since start_time for the newest `limit` buckets, newest
+        first, plus the total number of changes in the window. Grouped by the server.
+        """
+        self._check_table(table)
+        unit = self.HISTOGRAM_UNITS[bucket]
+        query = f"""
+            SELECT TIMESTAMPADD({unit}, TIMESTAMPDIFF({unit}, TIMESTAMP'2000-01-01 00:00:00', ROW_START),
+                                TIMESTAMP'2000-01-01 00:00:00') AS period,
+                   COUNT(*) AS change_count,
+                   SUM(COUNT(*)) OVER () AS total_changes
+            FROM {table}
+            FOR SYSTEM_TIME ALL
+            WHERE ROW_START >= %s
+            GROUP BY period
+            ORDER BY period DESC
+            LIMIT %s
+        """
+        self.row_cursor.execute(query, (self._time_param(start_time), int(limit)))
+        rows = self.row_cursor.fetchall()
+        total = int(rows[0][2]) if rows else 0
+        return [(period, change_count) for period, change_count, _ in rows], total
+    
+    def _between_query(self, table: str, start_time: datetime, end_time: datetime, 
+                       include_versioning: bool = False) -> Tuple[str, tuple]:
+        self._check_table(table)
+        # SELECT * leaves out the invisible period columns, so they are only projected on request
+        projection = "*, ROW_START, ROW_END" if include_versioning else "*"
         query = f"""
-            SELECT *, ROW_START, ROW_END 
+            SELECT {projection} 
             FROM {table} 
-            FOR SYSTEM_TIME BETWEEN '{start_time.strftime('%Y-%m-%d %H:%M:%S')}' 
-            AND '{end_time.strftime('%Y-%m-%d %H:%M:%S')}'
+            FOR SYSTEM_TIME BETWEEN %s AND %s
         """
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return query, (self._time_param(start_time), self._time_param(end_time))
     
-    def get_audit_trail(self, table: str, limit: int = 1000) -> List[Dict]:
+    def _audit_trail_query(self, table: str, limit: int, before: Optional[Dict] = None,
+                           start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                           projection: Optional[str] = None) -> Tuple[str, tuple]:
+        self._check_table(table)
+        pk = self.tables[table]
+        
+        # Keyset predicate: versions from one transaction share ROW_START, so break ties on the PK
+        conditions, params = [], ()
+        if before is not None:
+            conditions.append(f"(ROW_START, {pk}) < (%s, %s)")
+            params += (before['changed_at'], before[pk])
+        if start_time is not None:
+            conditions.append("ROW_START >= %s")
+            params += (self._time_param(start_time),)
+        if end_time is not None:
+            conditions.append("ROW_START <= %s")
+            params += (self._time_param(end_time),)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
         query = f"""
-            SELECT *, 
-                   ROW_START as changed_at,
-                   ROW_END as valid_until,
-                   CASE 
-                       WHEN ROW_END = TIMESTAMP'2038-01-19 03:14:07.999999' 
-                       THEN 'CURRENT'
-                       ELSE 'HISTORICAL'
-                   END as status
+            SELECT {projection or self.AUDIT_COLUMNS}
             FROM {table} 
             FOR SYSTEM_TIME ALL
-            ORDER BY ROW_START DESC 
-            LIMIT {limit}
+            {where}
+            ORDER BY ROW_START DESC, {pk} DESC 
+            LIMIT %s
         """
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return query, params + (int(limit),)
+    
+    def _check_table(self, table: str):
+        """Table names cannot be bound as parameters, so only known tables are interpolated"""
+        if table not in self.tables:
+            raise ValueError(f"Unknown table: {table}")
+    
+    @staticmethod
+    def _time_param(timestamp: datetime) -> datetime:
+        """Temporal predicates work at second precision on naive server-local time"""
+        return timestamp.replace(microsecond=0, tzinfo=None)
+    
+    def _stream(self, query: str, batch_size: int, params: tuple = ()) -> Iterator[Dict]:
+        """
+        Yield rows through an unbuffered cursor so only one batch is held in memory.
+        The connection is busy until the iterator is exhausted or closed.
+        """
+        batches = self._stream_batches(query, batch_size, params)
+        try:
+            for columns, rows in batches:
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            batches.close()
+    
+    def _stream_batches(self, query: str, batch_size: int, 
+                        params: tuple = ()) -> Iterator[Tuple[Tuple[str, ...], List[tuple]]]:
+        """Tuple rows from an unbuffered cursor, batch by batch, with the column names read once"""
+        cursor = self.conn.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            columns = tuple(column[0] for column in cursor.description)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cursor.close()
     
     def calculate_diff(self, before_data: List[Dict], after_data: List[Dict], table: str) -> Dict:
         pk = self.tables[table]
         before_dict = {row[pk]: row for row in before_data}
         after_dict = {row[pk]: row for row in after_data}
         
-        added = [row for key, row in after_dict.items() if key not in before_dict]
-        deleted = [row for key, row in before_dict.items() if key not in after_dict]
+        before_keys = before_dict.keys()
+        after_keys = after_dict.keys()
         
-        # Find modified records
+        added = [after_dict[key] for key in after_keys - before_keys]
+        deleted = [before_dict[key] for key in before_keys - after_keys]
+        
+        # Rows in a snapshot share their keys, so pick the compared columns once
+        sample = before_data[0] if before_data else {}
+        columns = tuple(key for key in sample if key not in self.IGNORE_KEYS)
+        
+        # Same column set on both sides: pull the values out as tuples in C and let
+        # tuple equality settle the common unchanged case before naming any fields
+        if len(columns) > 1 and after_data and sample.keys() == after_data[0].keys():
+            values = itemgetter(*columns)
+        else:
+            values = None
+        
+        # Find modified records, one scan yields both the verdict and the changed fields
         modified = []
-        for key in set(before_dict.keys()) & set(after_dict.keys()):
+        for key in before_keys & after_keys:
             before_row = before_dict[key]
             after_row = after_dict[key]
             
-            if self._rows_different(before_row, after_row):
+            if values is not None:
+                before_vals = values(before_row)
+                after_vals = values(after_row)
+                if before_vals == after_vals:
+                    continue
+                changes = [
+                    {'field': column, 'before': before_val, 'after': after_val}
+                    for column, before_val, after_val in zip(columns, before_vals, after_vals)
+                    if before_val != after_val
+                ]
+            else:
+                changes = [
+                    {'field': column, 'before': before_row.get(column), 'after': after_row.get(column)}
+                    for column in columns
+                    if before_row.get(column) != after_row.get(column)
+                ]
+            if changes:
                 modified.append({
                     'before': before_row,
                     'after': after_row,
-                    'changes': self._get_field_changes(before_row, after_row)
+                    'changes': changes
                 })
         
         return {
@@ -99,30 +492,114 @@ class TemporalEngine:
             }
         }
     
+    def diff_between(self, table: str, before_ts: Optional[datetime], 
+                     after_ts: Optional[datetime] = None) -> Dict:
+        """
+        calculate_diff worked out by the server: anti-joins for added and deleted
+        rows and a null-safe column comparison for modified ones, so only rows that
+        are part of the diff are sent back. A timestamp of None stands for the current state.
+        """
+        self._check_table(table)
+        pk = self.tables[table]
+        
+        def snapshot(timestamp: Optional[datetime], alias: str) -> Tuple[str, tuple]:
+            if timestamp is None:
+                return f"{table} AS {alias}", ()
+            return f"{table} FOR SYSTEM_TIME AS OF %s AS {alias}", (self._time_param(timestamp),)
+        
+        def missing_from(present_ts: Optional[datetime], absent_ts: Optional[datetime]) -> List[Dict]:
+            present, present_params = snapshot(present_ts, 'present')
+            absent, absent_params = snapshot(absent_ts, 'absent')
+            self.row_cursor.execute(f"""
+                SELECT present.* 
+                FROM {present}
+                LEFT JOIN {absent} ON absent.{pk} = present.{pk}
+                WHERE absent.{pk} IS NULL
+            """, present_params + absent_params)
+            columns = tuple(column[0] for column in self.row_cursor.description)
+            return [dict(zip(columns, row)) for row in self.row_cursor]
+        
+        added = missing_from(after_ts, before_ts)
+        deleted = missing_from(before_ts, after_ts)
+        
+        # Column names come from an empty read. <=> treats two NULLs as equal and BINARY
+        # keeps case-only edits from comparing equal under a case-insensitive collation
+        self.row_cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        columns = tuple(column[0] for column in self.row_cursor.description)
+        self.row_cursor.fetchall()
+        unchanged = " AND ".join(f"BINARY b.{column} <=> BINARY a.{column}" for column in columns)
+        before, before_params = snapshot(before_ts, 'b')
+        after, after_params = snapshot(after_ts, 'a')
+        self.row_cursor.execute(f"""
+            SELECT b.*, a.* 
+            FROM {before}
+            JOIN {after} ON a.{pk} = b.{pk}
+            WHERE NOT ({unchanged})
+        """, before_params + after_params)
+        
+        width = len(columns)
+        modified = []
+        for row in self.row_cursor:
+            before_row = row[:width]
+            after_row = row[width:]
+            modified.append({
+                'before': dict(zip(columns, before_row)),
+                'after': dict(zip(columns, after_row)),
+                'changes': [
+                    {'field': column, 'before': before_val, 'after': after_val}
+                    for column, before_val, after_val in zip(columns, before_row, after_row)
+                    if before_val != after_val
+                ]
+            })
+        
+        return {
+            'added': added,
+            'deleted': deleted,
+            'modified': modified,
+            'summary': {
+                'total_added': len(added),
+                'total_deleted': len(deleted),
+                'total_modified': len(modified)
+            }
+        }
+    
+    def invalidate_cache(self, table: str):
+        """Forget cached reads of a table after writing to it"""
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table)
+    
     def restore_records(self, table: str, records: List[Dict]) -> Dict:
         restored_count = 0
         errors = []
+        pk = self.tables[table]
         
         try:
             self.conn.begin()
             
+            # Group rows by column set so each group is one statement sent with executemany
+            groups = defaultdict(list)
             for record in records:
                 clean_record = {k: v for k, v in record.items() 
-                              if k not in ['ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status']}
+                              if k not in self.IGNORE_KEYS}
                 
-                columns = ', '.join(clean_record.keys())
-                placeholders = ', '.join(['%s' for _ in clean_record])
+                column_set = tuple(sorted(clean_record))
+                groups[column_set].append(tuple(clean_record[col] for col in column_set))
+            
+            for column_set, rows in groups.items():
+                columns = ', '.join(column_set)
+                placeholders = ', '.join(['%s' for _ in column_set])
                 
                 # Use INSERT ... ON DUPLICATE KEY UPDATE to preserve history
-                update_clause = ', '.join([f"{col} = VALUES({col})" for col in clean_record.keys() if col != self.tables[table]])
+                update_clause = ', '.join([f"{col} = VALUES({col})" for col in column_set if col != pk])
                 if update_clause:
                     query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {update_clause}"
                 else:
                     query = f"INSERT IGNORE INTO {table} ({columns}) VALUES ({placeholders})"
-                self.cursor.execute(query, list(clean_record.values()))
-                restored_count += 1
+                self.cursor.executemany(query, rows)
+                restored_count += len(rows)
             
             self.conn.commit()
+            self.invalidate_cache(table)
             
             return {
                 'success': True,
@@ -138,39 +615,90 @@ class TemporalEngine:
                 'errors': [str(e)]
             }
     
-    def _rows_different(self, row1: Dict, row2: Dict) -> bool:
-        ignore_keys = {'ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status'}
-        
-        for key in row1:
-            if key not in ignore_keys:
-                if row1.get(key) != row2.get(key):
-                    return True
-        return False
-    
-    def _get_field_changes(self, before_row: Dict, after_row: Dict) -> List[Dict]:
-        changes = []
-        ignore_keys = {'ROW_START', 'ROW_END', 'changed_at', 'valid_until', 'status'}
-        
-        for key in before_row:
-            if key not in ignore_keys:
-                before_val = before_row.get(key)
-                after_val = after_row.get(key)
-                
-                if before_val != after_val:
-                    changes.append({
-                        'field': key,
-                        'before': before_val,
-                        'after': after_val
-                    })
-        
-        return changes
+    @staticmethod
+    def _connect(config: Dict, pool: Optional[mariadb.ConnectionPool]):
+        """Borrow a pooled connection when possible, closing it returns it to the pool"""
+        if pool is not None:
+            try:
+                return pool.get_connection()
+            except mariadb.PoolError:
+                pass  # Pool exhausted, fall back to a dedicated connection
+        return mariadb.connect(**config)
     
     def close(self):
         if self.cursor:
             self.cursor.close()
+        if self.row_cursor:
+            self.row_cursor.close()
         if self.conn:
             self.conn.close()
 
-def create_engine() -> TemporalEngine:
-    from src.config import DATABASE_CONFIG
-    return TemporalEngine(DATABASE_CONFIG)
\ No newline at end of file
+class SnapshotCache:
+    """Memoize AS OF snapshots, which never change once their timestamp is in the past"""
+    
+    def __init__(self, engine: TemporalEngine, maxsize: int = 32):
+        self.engine = engine
+        self.maxsize = maxsize
+        self._snapshots = OrderedDict()
+    
+    def query_as_of(self, table: str, timestamp: datetime) -> List[Dict]:
+        # A timestamp that is not yet in the past can still gain versions
+        if timestamp >= datetime.now(timestamp.tzinfo):
+            return self.engine.query_as_of(table, timestamp)
+        
+        key = (table, timestamp)
+        if key in self._snapshots:
+            self._snapshots.move_to_end(key)
+            return self._snapshots[key]
+        
+        data = self.engine.query_as_of(table, timestamp)
+        self._snapshots[key] = data
+        if len(self._snapshots) > self.maxsize:
+            self._snapshots.popitem(last=False)
+        return data
+    
+    def prefetch(self, table: str, timestamps: List[datetime]):
+        """Load all missing past snapshots for a table in one engine round trip"""
+        missing = [
+            ts for ts in timestamps
+            if ts < datetime.now(ts.tzinfo) and (table, ts) not in self._snapshots
+        ]
+        if not missing:
+            return
+        
+        for ts, data in self.engine.query_as_of_batch(table, missing).items():
+            self._snapshots[(table, ts)] = data
+        while len(self._snapshots) > self.maxsize:
+            self._snapshots.popitem(last=False)
+    
+    def clear(self):
+        self._snapshots.clear()
+
+def to_columns(records: List[Dict]) -> Dict[str, tuple]:
+    """Transpose rows from a single query into one tuple per column"""
+    if not records:
+        return {}
+    return dict(zip(records[0].keys(), zip(*(record.values() for record in records))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool(config: Dict, size: int) -> mariadb.ConnectionPool:
+    """Process-wide connection pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = mariadb.ConnectionPool(pool_name='flightvault', pool_size=size, **config)
+        return _pool
+
+def close_pool():
+    """Close the process-wide pool, a later get_pool call opens a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def create_engine(query_cache: Optional[QueryCache] = None) -> TemporalEngine:
+    from src.config import DATABASE_CONFIG, POOL_SIZE
+    return TemporalEngine(DATABASE_CONFIG, get_pool(DATABASE_CONFIG, POOL_SIZE), query_cache)
\ No newline at end of file